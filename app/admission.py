@@ -0,0 +1,155 @@
+# Admission control for the expensive callbacks.
+#
+# Custom Analysis, curated figures that aren't cached yet (the anomaly scan above all)
+# and Data View pages share the server threads with cheap callbacks. Each expensive
+# callback gets a limiter: ADMISSION_CONCURRENCY calls run at once, up to
+# ADMISSION_QUEUE more wait (at most ADMISSION_QUEUE_WAIT_MS) for a slot, and anything
+# beyond that is turned away at once with a "busy, try again" response. Across all
+# limiters, expensive calls never occupy the last ADMISSION_RESERVED_THREADS threads
+# of a worker, so the About tab and cached figures always have a thread to run on.
+#
+# Counters (queue depth, waits, rejections) are per process and served as JSON at
+# /metrics/admission.
+#
+#   python app/admission.py         # limiter settings
+
+import functools
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from db import WEB_THREADS
+
+ADMISSION_CONCURRENCY = int(os.getenv("ADMISSION_CONCURRENCY", str(max(1, WEB_THREADS // 2))))
+ADMISSION_QUEUE = int(os.getenv("ADMISSION_QUEUE", "2"))
+ADMISSION_QUEUE_WAIT_MS = int(os.getenv("ADMISSION_QUEUE_WAIT_MS", "3000"))
+ADMISSION_RESERVED_THREADS = int(os.getenv("ADMISSION_RESERVED_THREADS", "1"))
+
+BUSY_NOTE = "The server is busy with other analyses - try again in a moment."
+
+_occupied = 0  # threads held by expensive calls, running or queued, across every limiter
+_occupied_lock = threading.Lock()
+
+
+class Busy(Exception):
+    """No slot for the call: the queue is full, the wait ran out or the reserve is reached."""
+
+
+class Limiter:
+    def __init__(self, name, concurrency=ADMISSION_CONCURRENCY, queue=ADMISSION_QUEUE,
+                 wait_ms=ADMISSION_QUEUE_WAIT_MS):
+        self.name = name
+        self.concurrency = concurrency
+        self.queue = queue
+        self.wait_ms = wait_ms
+        self.slots = threading.Semaphore(concurrency)
+        self.lock = threading.Lock()
+        self.running = self.waiting = 0
+        self.admitted = self.rejected = self.timed_out = 0
+        self.total_wait_ms = self.max_wait_ms = 0.0
+
+    def _enter(self):
+        global _occupied
+        with _occupied_lock, self.lock:
+            full = self.running + self.waiting >= self.concurrency + self.queue
+            if full or _occupied >= WEB_THREADS - ADMISSION_RESERVED_THREADS:
+                self.rejected += 1
+                raise Busy(self.name)
+            self.waiting += 1
+            _occupied += 1
+
+    def _leave(self):
+        global _occupied
+        with _occupied_lock:
+            _occupied -= 1
+
+    @contextmanager
+    def slot(self):
+        self._enter()
+        start = time.perf_counter()
+        acquired = self.slots.acquire(timeout=self.wait_ms / 1000)
+        waited = (time.perf_counter() - start) * 1000
+        with self.lock:
+            self.waiting -= 1
+            if acquired:
+                self.running += 1
+                self.admitted += 1
+                self.total_wait_ms += waited
+                self.max_wait_ms = max(self.max_wait_ms, waited)
+            else:
+                self.timed_out += 1
+        if not acquired:
+            self._leave()
+            raise Busy(self.name)
+        try:
+            yield
+        finally:
+            with self.lock:
+                self.running -= 1
+            self.slots.release()
+            self._leave()
+
+    def metrics(self):
+        with self.lock:
+            return {
+                "concurrency": self.concurrency,
+                "queue": self.queue,
+                "running": self.running,
+                "waiting": self.waiting,
+                "admitted": self.admitted,
+                "rejected": self.rejected,
+                "timed_out": self.timed_out,
+                "avg_wait_ms": round(self.total_wait_ms / self.admitted, 1) if self.admitted else 0.0,
+                "max_wait_ms": round(self.max_wait_ms, 1),
+            }
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def limiter(name):
+    with _limiters_lock:
+        if name not in _limiters:
+            _limiters[name] = Limiter(name)
+        return _limiters[name]
+
+
+def slot(name):
+    """Context manager holding one of name's slots; raises Busy when none can be had."""
+    return limiter(name).slot()
+
+
+def limit(name, busy):
+    """Run a callback under name's limiter; busy(*args) is returned when it is saturated."""
+    def decorate(callback):
+        @functools.wraps(callback)
+        def wrapper(*args, **kwargs):
+            try:
+                with slot(name):
+                    return callback(*args, **kwargs)
+            except Busy:
+                return busy(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def metrics():
+    with _limiters_lock:
+        limiters = dict(_limiters)
+    with _occupied_lock:
+        occupied = _occupied
+    return {
+        "pid": os.getpid(),
+        "threads": WEB_THREADS,
+        "reserved_threads": ADMISSION_RESERVED_THREADS,
+        "occupied_threads": occupied,
+        "callbacks": {name: l.metrics() for name, l in sorted(limiters.items())},
+    }
+
+
+if __name__ == "__main__":
+    print(f"per callback: {ADMISSION_CONCURRENCY} running, {ADMISSION_QUEUE} queued "
+          f"for up to {ADMISSION_QUEUE_WAIT_MS} ms")
+    print(f"threads kept for cheap callbacks: {ADMISSION_RESERVED_THREADS} of {WEB_THREADS}")
@@ -0,0 +1,7 @@
+// Cancel this visitor's running SQL console query when the page is closed or reloaded.
+// The dashboard_session cookie identifies the query; see /console/cancel in app.py.
+window.addEventListener("pagehide", function () {
+    if (navigator.sendBeacon) {
+        navigator.sendBeacon("/console/cancel");
+    }
+});
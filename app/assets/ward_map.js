@@ -0,0 +1,31 @@
+// Recolour the Ward Explorer maps when their metric changes, without a server round trip.
+// The colour classes and LISA clusters of every metric arrive with the page
+// (ward-map-scales, built by map_component.metric_scales, with the Moran's I cards
+// added by app.load_ward_map); this patches them into both figures.
+window.dash_clientside = window.dash_clientside || {};
+window.dash_clientside.ward_map = {
+    restyle: function (metric, scales) {
+        var no_update = window.dash_clientside.no_update;
+        var scale = scales && scales[metric];
+        if (!scale) {
+            return [no_update, no_update, no_update];
+        }
+        var map = new window.dash_clientside.Patch()
+            .assign(["data", 0, "z"], scale.z)
+            .assign(["data", 0, "zmin"], scale.zmin)
+            .assign(["data", 0, "zmax"], scale.zmax)
+            .assign(["data", 0, "colorscale"], scale.colorscale)
+            .assign(["data", 0, "text"], scale.text)
+            .assign(["data", 0, "colorbar", "title", "text"], scale.title)
+            .assign(["data", 0, "colorbar", "tickvals"], scale.tickvals)
+            .assign(["data", 0, "colorbar", "ticktext"], scale.ticktext)
+            .build();
+        var clusters = new window.dash_clientside.Patch()
+            .assign(["data", 0, "locations"], scale.clusters.locations)
+            .assign(["data", 0, "z"], scale.clusters.z)
+            .assign(["data", 0, "customdata"], scale.clusters.customdata)
+            .assign(["data", 0, "hovertemplate"], scale.clusters.hovertemplate)
+            .build();
+        return [map, clusters, scale.summary];
+    },
+};
@@ -0,0 +1,131 @@
+# Concurrent-user load test for a running dashboard.
+#
+# Each simulated user loads the page and then fires the callbacks a fresh visitor
+# triggers (initial curated figure, Data View columns and first page), in a loop, for a fixed
+# duration. Reports throughput and latency percentiles so the dev server and the
+# gunicorn setup can be compared on the same machine:
+#
+#   python app/benchmark.py --url http://localhost:8050 --users 20 --duration 30
+
+import argparse
+import json
+import statistics
+import threading
+import time
+import urllib.request
+
+
+def page_request(base_url):
+    return urllib.request.Request(f"{base_url}/")
+
+
+def callback_request(base_url, outputs, inputs, state=()):
+    """Build the POST Dash sends for a callback with the given outputs and inputs."""
+    output_ids = [{"id": component, "property": prop} for component, prop in outputs]
+    if len(outputs) == 1:
+        output = f"{outputs[0][0]}.{outputs[0][1]}"
+    else:
+        output = ".." + "...".join(f"{c}.{p}" for c, p in outputs) + ".."
+    payload = {
+        "output": output,
+        "outputs": output_ids if len(outputs) > 1 else output_ids[0],
+        "inputs": [{"id": c, "property": p, "value": v} for c, p, v in inputs],
+        "changedPropIds": [f"{c}.{p}" for c, p, _ in inputs],
+        "state": [{"id": c, "property": p, "value": v} for c, p, v in state],
+    }
+    return urllib.request.Request(
+        f"{base_url}/_dash-update-component",
+        data=json.dumps(payload).encode("utf-8"),
+        headers={"Content-Type": "application/json"},
+        method="POST",
+    )
+
+
+def visitor_session(base_url):
+    """The requests one new visitor makes on page load."""
+    return [
+        ("page", page_request(base_url)),
+        ("curated", callback_request(
+            base_url,
+            [("curated-viz-graph", "figure"), ("curated-description", "children"), ("curated-job", "data"),
+             ("curated-poll", "disabled"), ("curated-progress-row", "style")],
+            [("curated-select", "value", "curated_qol_turnout")],
+            [("curated-job", "data", None)],
+        )),
+        ("dataset", callback_request(
+            base_url,
+            [("sql-query-display", "children"), ("data-table", "columns"), ("data-table", "page_current"),
+             ("data-table", "filter_query"), ("data-table", "sort_by")],
+            [("dataset-dropdown", "value", "ward")],
+        )),
+        ("rows", callback_request(
+            base_url,
+            [("data-table", "data"), ("data-table", "page_count"), ("data-table-info", "children"),
+             ("data-table-message", "children"), ("data-table-bounds", "data")],
+            [("data-view-mode", "value", "paged"), ("data-table", "page_current", 0),
+             ("data-table", "page_size", 20), ("data-table", "filter_query", ""), ("data-table", "sort_by", [])],
+            [("dataset-dropdown", "value", "ward"), ("data-table-bounds", "data", {})],
+        )),
+    ]
+
+
+def run_user(base_url, deadline, results, lock):
+    requests = visitor_session(base_url)
+    while time.monotonic() < deadline:
+        for name, request in requests:
+            start = time.perf_counter()
+            try:
+                with urllib.request.urlopen(request, timeout=60) as response:
+                    response.read()
+                ok = True
+            except Exception:
+                ok = False
+            elapsed = time.perf_counter() - start
+            with lock:
+                results.append((name, ok, elapsed))
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--url", default="http://localhost:8050")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--duration", type=float, default=30)
+    args = parser.parse_args()
+
+    base_url = args.url.rstrip("/")
+    results = []
+    lock = threading.Lock()
+    deadline = time.monotonic() + args.duration
+
+    threads = [
+        threading.Thread(target=run_user, args=(base_url, deadline, results, lock))
+        for _ in range(args.users)
+    ]
+    started = time.monotonic()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.monotonic() - started
+
+    print(f"{args.users} users, {wall:.1f}s against {base_url}")
+    print(f"{'request':<10}{'count':>8}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}")
+    for name in ["page", "curated", "dataset", "rows"]:
+        times = [e * 1000 for n, ok, e in results if n == name and ok]
+        errors = sum(1 for n, ok, _ in results if n == name and not ok)
+        if times:
+            print(f"{name:<10}{len(times):>8}{errors:>8}{statistics.median(times):>10.0f}"
+                  f"{percentile(times, 95):>10.0f}{max(times):>10.0f}")
+        else:
+            print(f"{name:<10}{0:>8}{errors:>8}")
+    completed = sum(1 for _, ok, _ in results if ok)
+    print(f"throughput: {completed / wall:.1f} requests/s")
+
+
+if __name__ == "__main__":
+    main()
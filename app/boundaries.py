@@ -0,0 +1,197 @@
+# Boundary layers and their geometry pyramid.
+#
+# A layer (only "wards" so far - community and neighbourhood boundaries will follow) is
+# stored at several simplification levels, one per zoom range in PYRAMID_LEVELS. The
+# loader builds the pyramid right after loading the layer's boundaries, into the
+# boundary_pyramid table, as ready-to-serve GeoJSON. The app serves it at
+# /geometry/<layer>.geojson?zoom=N - the level for that zoom, gzipped when the client
+# accepts it, with cache headers - so the detailed geometry only ships to clients that
+# zoom in far enough to see it.
+#
+# Each level simplifies the layer as a coverage (see simplify_coverage), so neighbouring
+# polygons still meet without gaps or slivers at every level.
+#
+#   python app/boundaries.py             # levels stored for each layer
+#   python app/boundaries.py build       # (re)build the wards pyramid from the database
+
+import gzip
+import json
+import os
+import threading
+
+import numpy as np
+import shapely
+from sqlalchemy import text
+
+from db import get_engine
+from generation import on_generation_change
+
+PYRAMID_TABLE = "boundary_pyramid"
+
+# (min_zoom, tolerance in metres, coordinate decimals) - a level serves zooms from its
+# min_zoom up to the next level's. The tolerances stay around a pixel or two at the
+# zooms they serve (a web-mercator pixel is ~98 km / 2^zoom wide at Calgary's latitude);
+# the last level only cleans the coverage.
+PYRAMID_LEVELS = [
+    (0, 250, 3),
+    (11, 60, 4),
+    (13, 15, 5),
+    (15, 0, 6),
+]
+
+# browsers and proxies reuse a level this long before revalidating it by ETag
+GEOMETRY_MAX_AGE = int(os.getenv("GEOMETRY_MAX_AGE", "3600"))
+
+# the tolerance is applied in degrees, scaled by a degree of latitude
+METERS_PER_DEGREE = 111_320
+
+# per process: layer -> list of levels, dropped when the data generation changes
+_layers = {}
+_layers_lock = threading.Lock()
+
+################################################# SIMPLIFICATION #############################################
+
+def simplify_coverage(geometry, meters, decimals):
+    """A polygon coverage simplified within meters, with coordinates snapped to decimals
+    places.
+
+    Source boundaries tend to overlap slightly, so the coverage is cleaned first and every
+    shared border becomes exactly shared; it is then simplified once per border, so
+    neighbours still meet without gaps or slivers. Snapping can fold a vertex across a
+    neighbour's border, so the snapped coverage is cleaned once more.
+    """
+    geometry = shapely.coverage_clean(np.asarray(geometry))
+    if meters > 0:
+        geometry = shapely.coverage_simplify(geometry, meters / METERS_PER_DEGREE)
+    if decimals >= 0:
+        geometry = shapely.transform(geometry, lambda xy: np.round(xy, decimals))
+        geometry = shapely.coverage_clean(geometry)
+    return geometry
+
+################################################# BUILDING #############################################
+
+def feature_collection(ids, geometry, properties):
+    """GeoJSON text for the features; ids become the feature ids."""
+    features = [
+        {"type": "Feature", "id": int(i), "properties": props, "geometry": json.loads(shapely.to_geojson(g))}
+        for i, g, props in zip(ids, geometry, properties)
+    ]
+    return json.dumps({"type": "FeatureCollection", "features": features}, separators=(",", ":"))
+
+
+def build_pyramid(engine, layer, gdf, id_column, property_columns=()):
+    """Simplify gdf at every PYRAMID_LEVELS level and store the levels as layer."""
+    ids = gdf[id_column].to_numpy()
+    properties = gdf[list(property_columns)].to_dict("records")
+    rows = []
+    for level, (min_zoom, meters, decimals) in enumerate(PYRAMID_LEVELS):
+        geometry = simplify_coverage(gdf.geometry.values, meters, decimals)
+        rows.append({
+            "layer": layer,
+            "level": level,
+            "min_zoom": min_zoom,
+            "tolerance_m": meters,
+            "vertices": int(shapely.get_num_coordinates(geometry).sum()),
+            "geojson": feature_collection(ids, geometry, properties),
+        })
+
+    with engine.begin() as conn:
+        conn.execute(text(f"""
+            CREATE TABLE IF NOT EXISTS {PYRAMID_TABLE} (
+                layer TEXT NOT NULL,
+                level INTEGER NOT NULL,
+                min_zoom INTEGER NOT NULL,
+                tolerance_m REAL NOT NULL,
+                vertices INTEGER NOT NULL,
+                geojson TEXT NOT NULL,
+                PRIMARY KEY (layer, level)
+            );
+        """))
+        conn.execute(text(f"DELETE FROM {PYRAMID_TABLE} WHERE layer = :layer"), {"layer": layer})
+        conn.execute(text(f"""
+            INSERT INTO {PYRAMID_TABLE} (layer, level, min_zoom, tolerance_m, vertices, geojson)
+            VALUES (:layer, :level, :min_zoom, :tolerance_m, :vertices, :geojson)
+        """), rows)
+
+    for row in rows:
+        print(f"  {layer} level {row['level']} (zoom {row['min_zoom']}+, {row['tolerance_m']:g} m): "
+              f"{row['vertices']} vertices, {len(row['geojson']) // 1024} KB")
+    return rows
+
+
+def build_ward_pyramid(engine):
+    """The wards pyramid, from the boundaries already in the database - for databases
+    initialised from the schema dump, where the loader never ran."""
+    from map_component import load_ward_geometry
+
+    wards = load_ward_geometry()
+    return build_pyramid(engine, "wards", wards, "ward", ["LABEL", "COUNCILLOR"])
+
+################################################# SERVING #############################################
+
+def load_layer(layer):
+    """layer's levels as [{level, min_zoom, tolerance_m, body, gzipped}], read once per
+    process and data generation; empty when the layer has no pyramid."""
+    with _layers_lock:
+        if layer in _layers:
+            return _layers[layer]
+    try:
+        with get_engine().connect() as conn:
+            rows = conn.execute(text(f"""
+                SELECT level, min_zoom, tolerance_m, geojson
+                FROM {PYRAMID_TABLE}
+                WHERE layer = :layer
+                ORDER BY level
+            """), {"layer": layer}).mappings().all()
+    except Exception as e:
+        print(f"Boundary pyramid unavailable: {str(e).splitlines()[0]}")
+        return []
+
+    levels = []
+    for row in rows:
+        body = row["geojson"].encode("utf-8")
+        levels.append({
+            "level": row["level"],
+            "min_zoom": row["min_zoom"],
+            "tolerance_m": row["tolerance_m"],
+            "body": body,
+            "gzipped": gzip.compress(body, compresslevel=9),
+        })
+    if levels:
+        with _layers_lock:
+            _layers[layer] = levels
+    return levels
+
+
+def level_for_zoom(levels, zoom):
+    """The most detailed level whose min_zoom is at or below zoom (the coarsest one for
+    zooms below every level)."""
+    chosen = levels[0]
+    for level in levels:
+        if level["min_zoom"] <= zoom:
+            chosen = level
+    return chosen
+
+
+@on_generation_change
+def _clear_layers(old, new):
+    if old is not None:
+        with _layers_lock:
+            _layers.clear()
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) > 1 and sys.argv[1] == "build":
+        build_ward_pyramid(get_engine())
+    else:
+        with get_engine().connect() as conn:
+            rows = conn.execute(text(f"""
+                SELECT layer, level, min_zoom, tolerance_m, vertices, length(geojson) AS size
+                FROM {PYRAMID_TABLE}
+                ORDER BY layer, level
+            """)).all()
+        for row in rows:
+            print(f"{row.layer:12} level {row.level}  zoom {row.min_zoom:>2}+  {row.tolerance_m:>5g} m  "
+                  f"{row.vertices:>6} vertices  {row.size // 1024:>5} KB")
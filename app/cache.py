@@ -0,0 +1,373 @@
+# Shared cache for query results and rendered figures.
+#
+# Entries live outside the process so they survive restarts and are shared by every
+# worker. Two local backends are available (CACHE_BACKEND):
+#   disk - SQLite file under CACHE_DIR (default)
+#   shm  - the same store on /dev/shm, i.e. memory backed and shared between processes
+#   none - caching disabled
+#
+# DataFrames are stored as compressed Arrow IPC, everything else (figures, text) as
+# zlib-compressed JSON. Every entry is tagged with the data generation it was built
+# from and reads only match the current one, so a reload invalidates the whole cache
+# atomically; stale rows are purged the first time a process notices the change.
+#
+# single_flight() puts a computation behind the cache so a burst of identical requests
+# runs it once: threads in a process wait on the one already computing, and across
+# workers the first to start claims the key in the store (an "in progress" row, no lock
+# held while it computes) while the others poll the store for its result - for no longer
+# than their callback's deadline can spare.
+
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import zlib
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+from plotly.io.json import to_json_plotly
+
+import resilience
+from generation import on_generation_change
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "disk")
+CACHE_DIR = Path(os.getenv("CACHE_DIR", BASE_DIR / ".cache"))
+SHM_DIR = Path(os.getenv("CACHE_SHM_DIR", "/dev/shm/calgary-ward-cache"))
+CACHE_MAX_BYTES = int(os.getenv("CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+# how long a worker waits for another to finish the same computation before doing it itself
+SINGLE_FLIGHT_WAIT = float(os.getenv("SINGLE_FLIGHT_WAIT", "30"))
+SINGLE_FLIGHT_POLL = 0.05
+
+KIND_ARROW = "arrow"
+KIND_JSON = "json"
+
+################################################# SERIALIZATION #############################################
+
+def serialize(value):
+    if isinstance(value, pd.DataFrame):
+        table = pa.Table.from_pandas(value, preserve_index=False)
+        sink = pa.BufferOutputStream()
+        options = pa.ipc.IpcWriteOptions(compression="zstd")
+        with pa.ipc.new_stream(sink, table.schema, options=options) as writer:
+            writer.write_table(table)
+        return KIND_ARROW, sink.getvalue().to_pybytes()
+
+    # plotly's encoder understands figures and numpy arrays
+    return KIND_JSON, zlib.compress(to_json_plotly(value).encode("utf-8"))
+
+
+def deserialize(kind, payload):
+    if kind == KIND_ARROW:
+        with pa.ipc.open_stream(payload) as reader:
+            return reader.read_all().to_pandas()
+    return json.loads(zlib.decompress(payload).decode("utf-8"))
+
+
+def make_key(namespace, parts):
+    raw = json.dumps(parts, sort_keys=True, default=str)
+    return f"{namespace}:{hashlib.sha1(raw.encode('utf-8')).hexdigest()}"
+
+################################################# BACKENDS #############################################
+
+class NullCache:
+    def get(self, namespace, parts, generation):
+        return None
+
+    def set(self, namespace, parts, generation, value):
+        pass
+
+    def purge(self, keep_generation=None):
+        pass
+
+    def claim(self, key, generation):
+        return True  # nothing shared between workers
+
+    def claimed(self, key, generation):
+        return False
+
+    def release(self, key, generation):
+        pass
+
+    def stats(self):
+        return {"backend": "none"}
+
+
+class SQLiteCache:
+    """Size-bounded store in a single SQLite file, safe across threads and processes."""
+
+    backend = "disk"
+
+    def __init__(self, directory, max_bytes=CACHE_MAX_BYTES):
+        self.path = Path(directory) / "cache.sqlite"
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS entries (
+                    key TEXT PRIMARY KEY,
+                    generation INTEGER NOT NULL,
+                    kind TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    accessed REAL NOT NULL,
+                    value BLOB NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)")
+            # computations in progress (single_flight)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS flights (
+                    key TEXT NOT NULL,
+                    generation INTEGER NOT NULL,
+                    started REAL NOT NULL,
+                    PRIMARY KEY (key, generation)
+                )
+            """)
+        # lock files of earlier versions
+        shutil.rmtree(self.path.parent / "locks", ignore_errors=True)
+
+    def _connect(self):
+        # one connection per thread, reopened after a fork
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, namespace, parts, generation):
+        key = make_key(namespace, parts)
+        try:
+            conn = self._connect()
+            row = conn.execute(
+                "SELECT kind, value FROM entries WHERE key = ? AND generation = ?",
+                (key, generation),
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE entries SET accessed = ? WHERE key = ?", (time.time(), key))
+            return deserialize(*row)
+        except sqlite3.Error as e:
+            print(f"Cache read error: {e}")
+            return None
+
+    def set(self, namespace, parts, generation, value):
+        key = make_key(namespace, parts)
+        kind, payload = serialize(value)
+        if len(payload) > self.max_bytes:
+            return
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?)",
+                (key, generation, kind, len(payload), time.time(), payload),
+            )
+            # evict least recently used entries beyond the size budget
+            conn.execute("""
+                DELETE FROM entries WHERE key IN (
+                    SELECT key FROM (
+                        SELECT key, SUM(size) OVER (ORDER BY accessed DESC, key) AS running
+                        FROM entries
+                    ) WHERE running > ?
+                )
+            """, (self.max_bytes,))
+            conn.execute("COMMIT")
+        except sqlite3.Error as e:
+            print(f"Cache write error: {e}")
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+
+    def claim(self, key, generation):
+        """Mark key as being computed; False if another worker already is. Claims older
+        than SINGLE_FLIGHT_WAIT (the worker died) are taken over."""
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            taken = conn.execute(
+                "SELECT 1 FROM flights WHERE key = ? AND generation = ? AND started > ?",
+                (key, generation, time.time() - SINGLE_FLIGHT_WAIT),
+            ).fetchone()
+            if not taken:
+                conn.execute("INSERT OR REPLACE INTO flights VALUES (?, ?, ?)", (key, generation, time.time()))
+            conn.execute("COMMIT")
+            return not taken
+        except sqlite3.Error as e:
+            print(f"Cache claim error: {e}")
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            return True
+
+    def claimed(self, key, generation):
+        try:
+            return self._connect().execute(
+                "SELECT 1 FROM flights WHERE key = ? AND generation = ? AND started > ?",
+                (key, generation, time.time() - SINGLE_FLIGHT_WAIT),
+            ).fetchone() is not None
+        except sqlite3.Error:
+            return False
+
+    def release(self, key, generation):
+        try:
+            self._connect().execute("DELETE FROM flights WHERE key = ? AND generation = ?", (key, generation))
+        except sqlite3.Error as e:
+            print(f"Cache release error: {e}")
+
+    def purge(self, keep_generation=None):
+        conn = self._connect()
+        if keep_generation is None:
+            conn.execute("DELETE FROM entries")
+        else:
+            conn.execute("DELETE FROM entries WHERE generation != ?", (keep_generation,))
+
+    def stats(self):
+        count, size = self._connect().execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries"
+        ).fetchone()
+        return {
+            "backend": self.backend,
+            "path": str(self.path),
+            "entries": count,
+            "bytes": size,
+            "max_bytes": self.max_bytes,
+        }
+
+
+class SharedMemoryCache(SQLiteCache):
+    """SQLite store on tmpfs - memory resident and visible to every worker on the host."""
+
+    backend = "shm"
+
+################################################# ACCESS #############################################
+
+_cache = None
+
+
+def get_cache():
+    global _cache
+    if _cache is None:
+        if CACHE_BACKEND == "none":
+            _cache = NullCache()
+        elif CACHE_BACKEND == "shm":
+            _cache = SharedMemoryCache(SHM_DIR)
+        else:
+            _cache = SQLiteCache(CACHE_DIR)
+    return _cache
+
+
+@on_generation_change
+def _purge_old_generations(old, new):
+    # not on the first lookup: every worker makes one when it starts, and entries of
+    # older generations are unreachable anyway
+    if old is not None:
+        print(f"Data generation changed ({old} -> {new}), purging cache.")
+        get_cache().purge(keep_generation=new)
+
+
+def load(namespace, parts, generation):
+    return get_cache().get(namespace, parts, generation)
+
+
+def store(namespace, parts, generation, value):
+    get_cache().set(namespace, parts, generation, value)
+
+################################################# SINGLE FLIGHT #############################################
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+_flights = {}
+_flights_lock = threading.Lock()
+
+
+def _wait_for(namespace, parts, generation):
+    """The value another worker is computing, once it is stored; None if it gave up
+    without storing one, or this caller can't wait any longer - for at most
+    SINGLE_FLIGHT_WAIT, and half of what is left of the callback's deadline, so the
+    caller still has time to compute it itself."""
+    wait = SINGLE_FLIGHT_WAIT
+    remaining = resilience.remaining_ms()
+    if remaining is not None:
+        wait = min(wait, remaining / 2000)
+    deadline = time.monotonic() + wait
+    key = make_key(namespace, parts)
+    while time.monotonic() < deadline:
+        time.sleep(SINGLE_FLIGHT_POLL)
+        value = load(namespace, parts, generation)
+        if value is not None or not get_cache().claimed(key, generation):
+            return value
+    return None
+
+
+def _compute_once(namespace, parts, generation, compute, keep):
+    key = make_key(namespace, parts)
+    cache = get_cache()
+    claimed = cache.claim(key, generation)
+    if not claimed:
+        value = _wait_for(namespace, parts, generation)
+        if value is not None:
+            return value
+        # whoever had it failed, didn't keep it or is too slow - compute it here
+    try:
+        value = compute()
+        if keep(value):
+            store(namespace, parts, generation, value)
+        return value
+    finally:
+        if claimed:
+            cache.release(key, generation)
+
+
+def single_flight(namespace, parts, generation, compute, keep=lambda value: True):
+    """The cached value, or compute() run once for every concurrent caller with the same
+    key; keep(value) decides whether the result is stored."""
+    value = load(namespace, parts, generation)
+    if value is not None:
+        return value
+
+    key = (make_key(namespace, parts), generation)
+    with _flights_lock:
+        flight = _flights.get(key)
+        leader = flight is None
+        if leader:
+            flight = _flights[key] = _Flight()
+
+    if not leader:
+        flight.done.wait()
+        if flight.error is None:
+            return flight.value
+        # the computation failed for the caller that ran it (it may have been cancelled
+        # on that visitor's behalf) - try again for this one
+        return compute()
+
+    try:
+        flight.value = _compute_once(namespace, parts, generation, compute, keep)
+        return flight.value
+    except BaseException as e:
+        flight.error = e
+        raise
+    finally:
+        with _flights_lock:
+            del _flights[key]
+        flight.done.set()
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) > 1 and sys.argv[1] == "clear":
+        get_cache().purge()
+        print("Cache cleared.")
+    print(get_cache().stats())
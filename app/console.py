@@ -0,0 +1,246 @@
+# Ad-hoc SQL console for the dashboard, with the limits that make it safe to expose.
+#
+# Queries run as the dashboard_console role (SELECT only, read-only transactions) on a
+# small engine of their own, so a heavy console query can't take connections from the
+# dashboard. Each run is one statement, in a read-only transaction with its own
+# statement_timeout, and reads rows through a server-side cursor until the row cap, the
+# result-size cap or the time limit is reached. The backend is tagged with the
+# visitor's console session, so the query can be cancelled from any worker when they
+# press Cancel or leave the console.
+#
+# The (capped) result is read once and kept in the shared cache; the browser gets one
+# page at a time, filtered and sorted on the server like the Data View's (see
+# paging.frame_page).
+#
+#   python app/console.py setup                  # create / update the read-only role
+#   python app/console.py run "SELECT * FROM ward"
+
+import os
+import re
+import sys
+import time
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+
+import pandas as pd
+from sqlalchemy import event, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import DBAPIError, TimeoutError as PoolTimeout
+
+import cache
+from db import DATABASE_URL, get_engine, make_engine
+from generation import current_generation
+
+CONSOLE_ROLE = "dashboard_console"
+CONSOLE_PASSWORD = os.getenv("CONSOLE_PASSWORD", "console_password")
+CONSOLE_DATABASE_URL = os.getenv(
+    "CONSOLE_DATABASE_URL",
+    make_url(DATABASE_URL).set(username=CONSOLE_ROLE, password=CONSOLE_PASSWORD)
+    .render_as_string(hide_password=False),
+)
+CONSOLE_POOL_SIZE = int(os.getenv("CONSOLE_POOL_SIZE", "2"))
+CONSOLE_TIMEOUT_MS = int(os.getenv("CONSOLE_TIMEOUT_MS", "10000"))
+CONSOLE_MAX_ROWS = int(os.getenv("CONSOLE_MAX_ROWS", "10000"))
+CONSOLE_MAX_BYTES = int(os.getenv("CONSOLE_MAX_BYTES", str(5 * 1024 * 1024)))
+FETCH_ROWS = 500
+
+ROLE_FILE = Path(__file__).resolve().parent / "sql" / "ddl" / "console_role.sql"
+
+# statements that return rows; SELECT-like ones are read through a cursor
+ROW_STATEMENTS = {"select", "with", "values", "table"}
+PLAIN_STATEMENTS = {"explain", "show"}
+
+_STATEMENT_TOKENS = re.compile(r"'(?:[^']|'')*'|\"[^\"]*\"|--[^\n]*|/\*.*?\*/|\$\$.*?\$\$|;", re.DOTALL)
+
+_engine = None
+
+
+class ConsoleError(Exception):
+    """A console query that was refused or could not run; the message is for the user."""
+
+
+@dataclass
+class ConsoleResult:
+    rows: pd.DataFrame
+    elapsed_ms: float
+    limit: str = ""  # which cap cut the result short, if any
+
+################################################# SETUP #############################################
+
+def role_statements(path=ROLE_FILE):
+    """Statements in the role file; ; inside $$ ... $$ blocks doesn't end one."""
+    statements, current, quoted = [], [], False
+    for line in path.read_text().splitlines():
+        if line.strip().startswith("--") and not quoted:
+            continue
+        current.append(line)
+        quoted ^= line.count("$$") % 2 == 1
+        if not quoted and line.rstrip().endswith(";"):
+            statements.append("\n".join(current).strip().rstrip(";"))
+            current = []
+    return [s for s in statements if s]
+
+
+def setup_role(engine=None):
+    engine = engine or get_engine()
+    database = make_url(DATABASE_URL).database
+    with engine.begin() as conn:
+        for statement in role_statements():
+            conn.execute(text(statement), {"password": CONSOLE_PASSWORD} if ":password" in statement else {})
+        conn.execute(text(f'GRANT CONNECT ON DATABASE "{database}" TO {CONSOLE_ROLE}'))
+    print(f"Console role {CONSOLE_ROLE} ready.")
+
+################################################# QUERIES #############################################
+
+def get_console_engine():
+    global _engine
+    if _engine is None:
+        _engine = make_engine(
+            CONSOLE_POOL_SIZE, 0,
+            application_name="calgary-ward-console",
+            statement_timeout_ms=CONSOLE_TIMEOUT_MS,
+            url=CONSOLE_DATABASE_URL,
+            pool_timeout=2,
+        )
+
+        @event.listens_for(_engine, "reset")
+        def _discard_session(dbapi_connection, record, reset_state):
+            # nothing a console query did (advisory locks, settings) outlives it
+            dbapi_connection.rollback()
+            if not reset_state.terminate_only:
+                dbapi_connection.autocommit = True
+                with dbapi_connection.cursor() as cursor:
+                    cursor.execute("DISCARD ALL")
+                dbapi_connection.autocommit = False
+    return _engine
+
+
+def check_sql(sql):
+    """The single statement in sql, without a trailing semicolon; refuses anything else."""
+    sql = sql.strip()
+    parts = [m.start() for m in _STATEMENT_TOKENS.finditer(sql) if m.group(0) == ";"]
+    if parts and sql[parts[-1] + 1:].strip() == "":
+        sql = sql[:parts[-1]].rstrip()
+        parts = parts[:-1]
+    if parts:
+        raise ConsoleError("Run one statement at a time.")
+
+    code = _STATEMENT_TOKENS.sub(lambda m: "" if m.group(0).startswith(("--", "/*")) else m.group(0), sql)
+    keyword = code.strip().split(None, 1)[0].lower() if code.strip() else ""
+    if keyword not in ROW_STATEMENTS | PLAIN_STATEMENTS:
+        raise ConsoleError("Only SELECT, WITH, VALUES, TABLE, EXPLAIN and SHOW statements can run here.")
+    return sql, keyword
+
+
+def session_tag(session_id):
+    return f"dashboard-console:{session_id}"
+
+
+def _row_bytes(row):
+    return sum(len(str(value)) for value in row) + 8 * len(row)
+
+
+def run(sql, session_id):
+    """Run one read-only statement for a console session and return a ConsoleResult."""
+    sql, keyword = check_sql(sql)
+    start = time.perf_counter()
+    deadline = start + CONSOLE_TIMEOUT_MS / 1000
+
+    try:
+        conn = get_console_engine().connect()
+    except PoolTimeout:
+        raise ConsoleError("The console is busy with other queries - try again in a moment.") from None
+    except DBAPIError as e:
+        raise ConsoleError(f"Could not connect as {CONSOLE_ROLE}: {e.orig}") from None
+
+    rows, size, limit = [], 0, ""
+    try:
+        conn.exec_driver_sql("SET TRANSACTION READ ONLY")
+        conn.exec_driver_sql("SELECT set_config('application_name', %s, true)", (session_tag(session_id),))
+        conn.exec_driver_sql("SELECT set_config('statement_timeout', %s, true)", (str(CONSOLE_TIMEOUT_MS),))
+
+        options = {"no_parameters": True, "stream_results": keyword in ROW_STATEMENTS}
+        result = conn.execution_options(**options).exec_driver_sql(sql)
+        columns = list(result.keys())
+        while not limit:
+            chunk = result.fetchmany(FETCH_ROWS)
+            if not chunk:
+                break
+            for row in chunk:
+                if len(rows) >= CONSOLE_MAX_ROWS:
+                    limit = f"row limit ({CONSOLE_MAX_ROWS} rows)"
+                    break
+                size += _row_bytes(row)
+                if size > CONSOLE_MAX_BYTES:
+                    limit = f"size limit ({CONSOLE_MAX_BYTES // 1024} KB)"
+                    break
+                rows.append(tuple(row))
+            if not limit and time.perf_counter() > deadline:
+                limit = f"time limit ({CONSOLE_TIMEOUT_MS} ms)"
+        result.close()
+    except DBAPIError as e:
+        code = getattr(e.orig, "pgcode", None)
+        if code == "57014":  # query_canceled - the timeout or a cancel
+            raise ConsoleError("Query cancelled (time limit reached, or cancelled by you).") from None
+        raise ConsoleError(str(e.orig).strip()) from None
+    finally:
+        conn.rollback()
+        conn.close()
+
+    df = pd.DataFrame.from_records(rows, columns=unique_names(columns), coerce_float=True)
+    return ConsoleResult(df, (time.perf_counter() - start) * 1000, limit)
+
+
+def unique_names(columns):
+    """Column names made unique (SELECT a.id, b.id has two "id"s), as the table needs."""
+    seen, names = {}, []
+    for column in columns:
+        seen[column] = seen.get(column, 0) + 1
+        names.append(column if seen[column] == 1 else f"{column}_{seen[column]}")
+    return names
+
+################################################# RESULTS #############################################
+
+def keep_result(df, session_id):
+    """Store a result in the shared cache for paging; returns its id."""
+    df = df.copy()
+    for column in df.columns[df.dtypes == object]:
+        # dates, JSON, arrays... are shown as text anyway
+        df[column] = df[column].map(lambda v: v if v is None or isinstance(v, str) else str(v))
+    result_id = uuid.uuid4().hex
+    cache.store("console", [session_id, result_id], current_generation(get_engine()), df)
+    return result_id
+
+
+def load_result(result_id, session_id):
+    """A stored result, or None once it has been evicted (or for another session)."""
+    return cache.load("console", [session_id, result_id], current_generation(get_engine()))
+
+
+def cancel(session_id):
+    """Cancel the session's running console query, from any worker. Returns how many were cancelled."""
+    with get_engine().connect() as conn:
+        cancelled = conn.execute(text("""
+            SELECT COUNT(*) FILTER (WHERE pg_cancel_backend(pid))
+            FROM pg_stat_activity
+            WHERE application_name = :tag AND state = 'active' AND pid <> pg_backend_pid()
+        """), {"tag": session_tag(session_id)}).scalar()
+    return cancelled or 0
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "setup"
+    if command == "setup":
+        setup_role()
+    elif command == "run":
+        try:
+            result = run(sys.argv[2], "cli")
+        except ConsoleError as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+        print(result.rows.to_string())
+        print(f"{len(result.rows)} rows in {result.elapsed_ms:.0f} ms {result.limit}")
+    else:
+        print(f"Unknown command: {command}")
+        sys.exit(2)
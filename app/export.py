@@ -0,0 +1,166 @@
+# Streaming CSV / Parquet export of the Data View datasets.
+#
+# Rows come from a server-side cursor (stream_results + yield_per) and are encoded one
+# chunk at a time, so an export holds a single chunk in memory however big the dataset
+# is, and the first bytes go out as soon as the first chunk is read. CSV chunks are
+# written as text; Parquet chunks become one row group each, with the schema fixed up
+# front from the column types so every row group matches.
+#
+# Downloads hold a connection for as long as they stream, so they get a small engine of
+# their own - EXPORT_POOL_SIZE connections per process, no overflow - and never take the
+# dashboard's or the scroll-mode cursors' connections. A download that finds them all
+# busy for EXPORT_WAIT_SECONDS is turned away (ExportsBusy) before it starts.
+#
+#   python app/export.py dataset.election_result csv > results.csv
+
+import csv
+import io
+import os
+import sys
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from sqlalchemy import text
+
+from sqlalchemy.exc import TimeoutError as PoolTimeout
+
+import paging
+import queries
+from db import make_engine
+
+EXPORT_CHUNK_ROWS = int(os.getenv("EXPORT_CHUNK_ROWS", "5000"))
+EXPORT_POOL_SIZE = int(os.getenv("EXPORT_POOL_SIZE", "2"))
+EXPORT_WAIT_SECONDS = float(os.getenv("EXPORT_WAIT_SECONDS", "5"))
+
+FORMATS = {
+    "csv": "text/csv",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+_ARROW_TYPES = {"numeric": pa.float64(), "datetime": pa.timestamp("us"), "text": pa.string()}
+# by type code, where paging.describe's kind is too coarse: integers, dates, timestamptz
+_EXACT_TYPES = {
+    20: pa.int64(), 21: pa.int64(), 23: pa.int64(),
+    1082: pa.date32(), 1184: pa.timestamp("us", tz="UTC"),
+}
+
+_engine = None
+
+
+class ExportsBusy(Exception):
+    """Every export connection is streaming another download."""
+
+
+def get_export_engine():
+    global _engine
+    if _engine is None:
+        _engine = make_engine(
+            EXPORT_POOL_SIZE, 0,
+            application_name="calgary-ward-dashboard-export",
+            pool_timeout=EXPORT_WAIT_SECONDS,
+        )
+    return _engine
+
+
+def _connect():
+    try:
+        return get_export_engine().connect()
+    except PoolTimeout as e:
+        raise ExportsBusy("too many downloads are running - try again shortly") from e
+
+
+def export_sql(query_name, filter_query=""):
+    """(SQL, binds, columns) for the dataset in key order, filtered like the Data View."""
+    query = queries.get(query_name)
+    columns = paging.describe(query_name)
+    filters = paging.parse_filter(filter_query, columns)
+    order = paging.sort_order(query, [], columns)
+    sql, binds = paging.ordered_sql(query, columns, filters, order)
+    return sql, binds, columns
+
+
+def row_chunks(sql, binds, chunk_rows=EXPORT_CHUNK_ROWS):
+    """Lists of row tuples, read through a server-side cursor."""
+    with _connect() as conn:
+        result = conn.execution_options(stream_results=True, yield_per=chunk_rows).execute(text(sql), binds)
+        for partition in result.partitions(chunk_rows):
+            yield [tuple(row) for row in partition]
+
+
+def csv_stream(query_name, filter_query=""):
+    sql, binds, columns = export_sql(query_name, filter_query)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    writer.writerow([c["id"] for c in columns])
+    for rows in row_chunks(sql, binds):
+        writer.writerows(rows)
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    # the header alone, for an empty result
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file that hands back what was written since the last drain."""
+
+    def __init__(self):
+        self.parts = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def drain(self):
+        data = b"".join(self.parts)
+        self.parts = []
+        return data
+
+
+def arrow_schema(columns, sql, binds):
+    # integer columns stay integers and timestamps keep their time; paging.describe
+    # only says "numeric" or "datetime"
+    with _connect() as conn:
+        description = conn.execute(text(f"SELECT * FROM ({sql}) AS typed LIMIT 0"), binds).cursor.description
+    exact = {d.name: _EXACT_TYPES[d.type_code] for d in description if d.type_code in _EXACT_TYPES}
+    return pa.schema([(c["id"], exact.get(c["id"], _ARROW_TYPES[c["type"]])) for c in columns])
+
+
+def parquet_stream(query_name, filter_query=""):
+    sql, binds, columns = export_sql(query_name, filter_query)
+    schema = arrow_schema(columns, sql, binds)
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema, compression="zstd")
+
+    for rows in row_chunks(sql, binds):
+        arrays = [
+            pa.array([row[i] for row in rows], type=field.type, from_pandas=True)
+            for i, field in enumerate(schema)
+        ]
+        writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
+
+def export_stream(query_name, fmt, filter_query=""):
+    if fmt == "csv":
+        return csv_stream(query_name, filter_query)
+    return parquet_stream(query_name, filter_query)
+
+
+if __name__ == "__main__":
+    name = sys.argv[1] if len(sys.argv) > 1 else "dataset.election_result"
+    fmt = sys.argv[2] if len(sys.argv) > 2 else "csv"
+    for chunk in export_stream(name, fmt):
+        sys.stdout.buffer.write(chunk)
@@ -0,0 +1,62 @@
+# Ward feature matrix - one row per ward with every characteristic and outcome the
+# dashboard plots. It is small, read-only and only changes when the loader runs, so it is
+# built once per data generation and kept in memory (preloaded before workers fork).
+
+import re
+
+import pandas as pd
+
+import queries
+from generation import current_generation
+
+_features = None
+_features_generation = None
+
+
+# mayoral candidates (by city-wide votes) whose ward vote shares join the matrix
+TOP_MAYOR_CANDIDATES = 4
+SHARE_PREFIX = "share_"
+
+
+def share_column(candidate_name):
+    return SHARE_PREFIX + re.sub(r"\W+", "_", candidate_name.strip().lower())
+
+
+def share_label(column):
+    """A readable label for a share_column()."""
+    return f"{column[len(SHARE_PREFIX):].replace('_', ' ').title()} (vote share)"
+
+
+def mayor_share_features() -> pd.DataFrame:
+    """Vote share of each top mayoral candidate per ward, plus the ward's winning margin
+    (percentage points between its first and second place)."""
+    shares = queries.run("features.mayor_shares")
+    top = shares.groupby("candidate_name")["votes"].sum().nlargest(TOP_MAYOR_CANDIDATES).index
+    wide = shares[shares["candidate_name"].isin(top)].pivot(
+        index="ward_number", columns="candidate_name", values="vote_share"
+    )
+    wide = wide[list(top)].rename(columns=share_column)
+
+    ranked = shares.sort_values(["ward_number", "vote_share"], ascending=[True, False])
+    first_two = ranked.groupby("ward_number")["vote_share"].apply(lambda s: s.iloc[0] - s.iloc[1:2].sum())
+    wide["winning_margin"] = first_two
+    return wide
+
+
+def load_ward_features() -> pd.DataFrame:
+    df = queries.run("features.ward_features").set_index("ward_number")
+    ages = queries.run("features.age_gender_shares").set_index("ward_number")
+    df = df.join(ages).join(mayor_share_features())
+    # numeric columns come back as Decimal objects - make the whole matrix float
+    return df.astype(float)
+
+
+def ward_features(engine) -> pd.DataFrame:
+    """The feature matrix for the current data generation, indexed by ward number."""
+    global _features, _features_generation
+
+    generation = current_generation(engine)
+    if _features is None or _features_generation != generation:
+        _features = load_ward_features()
+        _features_generation = generation
+    return _features
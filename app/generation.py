@@ -0,0 +1,76 @@
+# Tracks the "data generation" - a counter the loader bumps every time it finishes a load.
+# Anything derived from the database (cached queries, figures, the map) is keyed on it,
+# so a reload makes every old entry unreachable in one step.
+
+import os
+import time
+from sqlalchemy import text
+
+import resilience
+
+GENERATION_TABLE = "data_generation"
+UNDEFINED_TABLE = "42P01"
+
+# how long a process trusts its last lookup before asking the database again
+GENERATION_TTL = float(os.getenv("GENERATION_TTL", "5"))
+
+_generation = None
+_checked_at = 0.0
+_listeners = []
+
+
+def bump_generation(engine):
+    """Record a finished load. Called by the loader as its last step."""
+    with engine.begin() as conn:
+        conn.execute(text(f"""
+            CREATE TABLE IF NOT EXISTS {GENERATION_TABLE} (
+                generation BIGSERIAL PRIMARY KEY,
+                loaded_at TIMESTAMPTZ NOT NULL DEFAULT now()
+            );
+        """))
+        generation = conn.execute(text(
+            f"INSERT INTO {GENERATION_TABLE} DEFAULT VALUES RETURNING generation"
+        )).scalar()
+    print(f"Data generation is now {generation}.")
+    return generation
+
+
+def on_generation_change(callback):
+    """Register callback(old, new) to run when this process sees a new generation.
+    old is None on the first lookup after startup."""
+    _listeners.append(callback)
+    return callback
+
+
+def current_generation(engine):
+    global _generation, _checked_at
+
+    now = time.monotonic()
+    if _generation is not None and now - _checked_at < GENERATION_TTL:
+        return _generation
+    if _generation is not None and resilience.breaker.is_open():
+        # the database is known to be down - don't wait on a connect timeout to find out
+        return _generation
+
+    try:
+        with engine.connect() as conn:
+            generation = conn.execute(text(f"""
+                SELECT COALESCE(MAX(generation), 0)
+                FROM {GENERATION_TABLE}
+            """)).scalar()
+    except Exception as e:
+        if getattr(getattr(e, "orig", None), "pgcode", None) == UNDEFINED_TABLE:
+            # database initialised from the dump, the loader never ran
+            generation = 0
+        else:
+            # database unreachable - keep serving whatever we knew last. A guess isn't
+            # an answer, so it never reaches the listeners
+            _checked_at = now
+            return _generation if _generation is not None else 0
+
+    _checked_at = now
+    if generation != _generation:
+        old, _generation = _generation, generation
+        for callback in _listeners:
+            callback(old, generation)
+    return _generation
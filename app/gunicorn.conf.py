@@ -0,0 +1,41 @@
+# Production server settings, used by entrypoint.sh when SERVER_MODE=production:
+#   gunicorn -c app/gunicorn.conf.py
+
+import os
+import sys
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8050')}"
+wsgi_app = "wsgi:server"
+pythonpath = os.path.dirname(os.path.abspath(__file__))
+
+# the same worker and thread counts the connection pools are sized for (db.py)
+sys.path.insert(0, pythonpath)
+from db import WEB_THREADS, WEB_WORKERS
+
+# threaded workers - callbacks mostly wait on Postgres, so threads keep a worker busy
+worker_class = "gthread"
+workers = WEB_WORKERS
+threads = WEB_THREADS
+
+# import the app (and preload the map, geometry and ward features) once in the master;
+# workers inherit it copy-on-write instead of each rebuilding it
+preload_app = True
+
+timeout = int(os.getenv("WEB_TIMEOUT", "120"))
+graceful_timeout = 30
+keepalive = 5
+
+# recycle workers now and then to keep memory growth in check
+max_requests = int(os.getenv("WEB_MAX_REQUESTS", "2000"))
+max_requests_jitter = 200
+
+accesslog = "-" if os.getenv("WEB_ACCESS_LOG") else None
+errorlog = "-"
+loglevel = os.getenv("WEB_LOG_LEVEL", "info")
+
+
+def post_worker_init(worker):
+    # the master disposed its connections before forking - open this worker's pool now
+    # rather than on the first callbacks
+    from db import warmup
+    warmup()
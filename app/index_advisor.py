@@ -0,0 +1,289 @@
+# Index advisor for the dashboard workload.
+#
+# Runs EXPLAIN (ANALYZE, BUFFERS) over every registered query (app/sql/*.sql) and reports
+# sequential scans, row-estimate errors and the indexes the plans suggest. The index set
+# the loader creates lives in app/sql/ddl/indexes.sql; "compare" shows what it buys by
+# timing the workload without and with it.
+#
+#   python app/index_advisor.py report [--schema synthetic]
+#   python app/index_advisor.py synth --scale 20      # build a scaled copy in schema "synthetic"
+#   python app/index_advisor.py compare --schema synthetic [--runs 5]
+#   python app/index_advisor.py apply [--schema public]
+
+import argparse
+import json
+import re
+import statistics
+from pathlib import Path
+
+from sqlalchemy import text
+
+import queries
+from db import get_engine
+
+INDEX_FILE = Path(__file__).resolve().parent / "sql" / "ddl" / "indexes.sql"
+
+# a plan row estimate this many times off in either direction is worth reporting
+ESTIMATE_ERROR_RATIO = 10
+# sequential scans over fewer rows than this are cheaper than any index
+LARGE_SCAN_ROWS = 1000
+
+# tables copied into the synthetic schema; the election tables are multiplied
+SCALED_TABLES = ["voting_station", "election_result"]
+COPIED_TABLES = [
+    "ward", "election", "race", "candidate", "candidacy",
+    "ward_population", "ward_income", "ward_education", "ward_age_gender",
+    "ward_labour_force", "ward_transport_mode", "ward_crime", "ward_disorder",
+    "ward_transit_stops", "ward_recreation", "community_services",
+]
+STATION_OFFSET = 1_000_000
+
+################################################# INDEX SET #############################################
+
+def index_statements():
+    """(index name, CREATE statement) pairs from indexes.sql."""
+    sql = "\n".join(
+        line for line in INDEX_FILE.read_text().splitlines() if not line.strip().startswith("--")
+    )
+    statements = []
+    for statement in sql.split(";"):
+        match = re.search(r"CREATE INDEX IF NOT EXISTS (\w+)", statement)
+        if match:
+            statements.append((match.group(1), statement.strip()))
+    return statements
+
+
+def create_indexes(conn, schema="public"):
+    conn.execute(text(f"SET LOCAL search_path TO {schema}"))
+    for name, statement in index_statements():
+        conn.execute(text(statement))
+
+
+def drop_indexes(conn, schema="public"):
+    for name, _ in index_statements():
+        conn.execute(text(f"DROP INDEX IF EXISTS {schema}.{name}"))
+
+
+def vacuum_analyze(engine, schema="public"):
+    # fresh statistics for the planner, and a visibility map so the covering indexes
+    # can be used for index-only scans right after a bulk load
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        for table in COPIED_TABLES + SCALED_TABLES:
+            conn.execute(text(f"VACUUM ANALYZE {schema}.{table}"))
+
+
+def existing_index_columns(conn, schema="public"):
+    """{table: set of leading index columns} for every index in the schema."""
+    rows = conn.execute(text("""
+        SELECT t.relname, a.attname
+        FROM pg_index i
+        JOIN pg_class t ON t.oid = i.indrelid
+        JOIN pg_namespace n ON n.oid = t.relnamespace
+        JOIN pg_attribute a ON a.attrelid = t.oid AND a.attnum = i.indkey[0]
+        WHERE n.nspname = :schema
+    """), {"schema": schema})
+    leading = {}
+    for table, column in rows:
+        leading.setdefault(table, set()).add(column)
+    return leading
+
+################################################# PLAN ANALYSIS #############################################
+
+def walk(node):
+    yield node
+    for child in node.get("Plans", []):
+        yield from walk(child)
+
+
+def condition_columns(condition):
+    """(alias or None, column) pairs referenced by a plan condition string."""
+    condition = re.sub(r"'(?:[^']|'')*'", "''", condition)  # drop literals
+    pairs = re.findall(r"(?:\b(\w+)\.)?\b([a-z_][a-z0-9_]*)\b(?!\s*\()", condition)
+    skip = {"text", "numeric", "integer", "bigint", "and", "or", "not", "null", "is", "any"}
+    return [(alias or None, column) for alias, column in pairs if column not in skip]
+
+
+def analyze_plan(plan):
+    """Seq scans, estimate errors and (table, column) index candidates for one plan."""
+    nodes = list(walk(plan["Plan"]))
+    aliases = {n["Alias"]: n["Relation Name"] for n in nodes if "Relation Name" in n}
+
+    seq_scans, estimate_errors, candidates = [], [], set()
+    join_columns = set()
+
+    for node in nodes:
+        loops = node.get("Actual Loops", 1)
+        actual = node.get("Actual Rows", 0) * loops
+        planned = node.get("Plan Rows", 0) * loops
+
+        if max(actual, planned) >= 100:
+            ratio = (max(actual, planned) + 1) / (min(actual, planned) + 1)
+            if ratio >= ESTIMATE_ERROR_RATIO:
+                estimate_errors.append({
+                    "node": node["Node Type"],
+                    "relation": node.get("Relation Name", ""),
+                    "planned": int(planned),
+                    "actual": int(actual),
+                })
+
+        for key in ("Hash Cond", "Merge Cond", "Join Filter"):
+            for alias, column in condition_columns(node.get(key, "")):
+                if alias in aliases:
+                    join_columns.add((aliases[alias], column))
+
+        if node["Node Type"] == "Seq Scan":
+            scanned = actual + node.get("Rows Removed by Filter", 0) * loops
+            seq_scans.append({
+                "relation": node["Relation Name"],
+                "rows": int(scanned),
+                "filter": node.get("Filter", ""),
+            })
+            if scanned >= LARGE_SCAN_ROWS and node.get("Filter"):
+                for _, column in condition_columns(node["Filter"]):
+                    candidates.add((node["Relation Name"], column))
+
+    # join keys on big sequentially scanned tables
+    big_scans = {s["relation"] for s in seq_scans if s["rows"] >= LARGE_SCAN_ROWS}
+    candidates |= {(table, column) for table, column in join_columns if table in big_scans}
+
+    return {
+        "execution_ms": plan.get("Execution Time", 0.0),
+        "planning_ms": plan.get("Planning Time", 0.0),
+        "seq_scans": seq_scans,
+        "estimate_errors": estimate_errors,
+        "candidates": candidates,
+    }
+
+
+def explain_json(conn, query):
+    result = queries.execute(conn, query, prefix="EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) ")
+    plan = result.scalar()
+    return (json.loads(plan) if isinstance(plan, str) else plan)[0]
+
+
+def workload():
+    # parameterised queries have no values to explain with
+    return [q for q in queries.REGISTRY.values() if not q.params]
+
+
+def run_workload(schema, runs=1):
+    """{query name: [analysis per run]} for the whole workload in schema."""
+    results = {}
+    with get_engine().connect() as conn:
+        conn.execute(text(f"SET search_path TO {schema}"))
+        for query in workload():
+            results[query.name] = [analyze_plan(explain_json(conn, query)) for _ in range(runs)]
+        # the connection now has a custom search_path and prepared statements - drop it
+        conn.invalidate()
+    return results
+
+################################################# COMMANDS #############################################
+
+def report(schema):
+    results = run_workload(schema)
+    with get_engine().connect() as conn:
+        indexed = existing_index_columns(conn, schema)
+
+    suggestions = {}
+    for name, (analysis,) in results.items():
+        print(f"\n{name}  ({analysis['execution_ms']:.1f} ms, planning {analysis['planning_ms']:.1f} ms)")
+        for scan in analysis["seq_scans"]:
+            flt = f"  filter: {scan['filter']}" if scan["filter"] else ""
+            print(f"  seq scan  {scan['relation']:<22} {scan['rows']:>9} rows{flt}")
+        for error in analysis["estimate_errors"]:
+            print(f"  estimate  {error['node']:<22} planned {error['planned']}, actual {error['actual']}"
+                  f"  {error['relation']}")
+        for candidate in analysis["candidates"]:
+            suggestions.setdefault(candidate, []).append(name)
+
+    print("\nSuggested indexes:")
+    missing = [(t, c) for t, c in sorted(suggestions) if c not in indexed.get(t, set())]
+    if not missing:
+        print("  none - every candidate column already leads an index")
+    for table, column in missing:
+        used_by = suggestions[(table, column)]
+        print(f"  CREATE INDEX ON {table} ({column});  -- {len(used_by)} queries: {', '.join(used_by[:3])}")
+
+
+def synth(scale):
+    with get_engine().begin() as conn:
+        conn.execute(text("DROP SCHEMA IF EXISTS synthetic CASCADE"))
+        conn.execute(text("CREATE SCHEMA synthetic"))
+        for table in COPIED_TABLES + SCALED_TABLES:
+            conn.execute(text(
+                f"CREATE TABLE synthetic.{table} (LIKE public.{table} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"
+            ))
+        for table in COPIED_TABLES:
+            conn.execute(text(f"INSERT INTO synthetic.{table} SELECT * FROM public.{table}"))
+
+        # every copy k of a station gets station_code + k * STATION_OFFSET
+        conn.execute(text(f"""
+            INSERT INTO synthetic.voting_station
+            SELECT station_code + k * {STATION_OFFSET}, ward_number, station_name, station_type
+            FROM public.voting_station, generate_series(0, :scale - 1) AS k
+        """), {"scale": scale})
+        conn.execute(text(f"""
+            INSERT INTO synthetic.election_result
+            SELECT station_code + k * {STATION_OFFSET}, candidate_id, race_id, votes
+            FROM public.election_result, generate_series(0, :scale - 1) AS k
+        """), {"scale": scale})
+
+        # primary keys only, like the production schema before the advisor's indexes
+        for table in COPIED_TABLES + SCALED_TABLES:
+            pk = conn.execute(text("""
+                SELECT string_agg(a.attname, ', ' ORDER BY array_position(i.indkey, a.attnum))
+                FROM pg_index i
+                JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = ANY(i.indkey)
+                WHERE i.indrelid = CAST(:table AS regclass) AND i.indisprimary
+            """), {"table": f"public.{table}"}).scalar()
+            if pk:
+                conn.execute(text(f"ALTER TABLE synthetic.{table} ADD PRIMARY KEY ({pk})"))
+        rows = conn.execute(text("SELECT COUNT(*) FROM synthetic.election_result")).scalar()
+    vacuum_analyze(get_engine(), "synthetic")
+    print(f"Built schema synthetic at scale {scale} ({rows} election results).")
+
+
+def compare(schema, runs):
+    def median_ms(results):
+        return {
+            name: statistics.median(a["execution_ms"] + a["planning_ms"] for a in analyses)
+            for name, analyses in results.items()
+        }
+
+    with get_engine().begin() as conn:
+        drop_indexes(conn, schema)
+    vacuum_analyze(get_engine(), schema)
+    before = median_ms(run_workload(schema, runs))
+
+    with get_engine().begin() as conn:
+        create_indexes(conn, schema)
+    vacuum_analyze(get_engine(), schema)
+    after = median_ms(run_workload(schema, runs))
+
+    print(f"{'query':<36}{'before ms':>11}{'after ms':>10}{'speedup':>9}")
+    for name in sorted(before, key=lambda n: -before[n]):
+        speedup = before[name] / after[name] if after[name] else 0
+        print(f"{name:<36}{before[name]:>11.1f}{after[name]:>10.1f}{speedup:>8.1f}x")
+    print(f"{'total':<36}{sum(before.values()):>11.1f}{sum(after.values()):>10.1f}"
+          f"{sum(before.values()) / sum(after.values()):>8.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Index advisor for the dashboard queries")
+    parser.add_argument("command", choices=["report", "synth", "compare", "apply"])
+    parser.add_argument("--schema", default="public")
+    parser.add_argument("--scale", type=int, default=20)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    if args.command == "report":
+        report(args.schema)
+    elif args.command == "synth":
+        synth(args.scale)
+    elif args.command == "compare":
+        compare(args.schema, args.runs)
+    else:
+        with get_engine().begin() as conn:
+            create_indexes(conn, args.schema)
+        vacuum_analyze(get_engine(), args.schema)
+        print(f"Created {len(index_statements())} indexes in {args.schema}.")
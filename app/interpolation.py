@@ -0,0 +1,162 @@
+# Areal interpolation - ward-level counts re-aggregated from one set of ward boundaries
+# onto another.
+#
+# The census-style ward tables and the election results were produced for older ward
+# lines than the boundaries in ward_boundaries_20251117. Given the boundaries they were
+# produced for (a CSV in the same WKT format as datasets/Ward_Boundaries_20251117.csv),
+# a Crosswalk intersects the two sets once - an STRtree over the target wards finds the
+# overlapping pairs, areas come from an equal-area projection - and keeps the result as a
+# sparse weight matrix: weight[t, s] is the share of source ward s's area inside target
+# ward t. Re-aggregating a table is then one sparse matrix product for all its columns,
+# assuming each count is spread evenly over its source ward.
+#
+# Only counts can be re-aggregated this way; rates and percentages should be recomputed
+# from re-aggregated counts. Long tables (ward x age group x gender...) keep their
+# category columns. The weights are cached per pair of boundary sets and data generation.
+#
+# No older boundary file ships with the project yet; with the current boundaries as both
+# sets the crosswalk is the identity, which is a handy check.
+#
+#   python app/interpolation.py OLD.csv                            # crosswalk OLD -> current wards
+#   python app/interpolation.py OLD.csv ward_population ward_income  # ... and re-aggregated tables
+#   python app/interpolation.py OLD.csv NEW.csv ward_age_gender      # between two boundary files
+
+import hashlib
+import sys
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import shapely
+from scipy import sparse
+from shapely import wkt
+
+import cache
+from boundaries import simplify_coverage
+from db import get_engine
+from generation import current_generation
+
+# numeric columns with these in their name are rates or averages, not counts, and are
+# left out unless asked for by name
+NOT_COUNTS = ("rate", "percent", "pct", "density", "avg")
+
+
+def read_boundaries(path, id_column="WARD_NUM", geometry_column="MULTIPOLYGON"):
+    """A boundary set from a WKT CSV, as a GeoDataFrame with ward and geometry."""
+    df = pd.read_csv(path)
+    df.columns = df.columns.str.strip().str.upper()
+    geometry = df[geometry_column.upper()].apply(wkt.loads)
+    return gpd.GeoDataFrame({"ward": df[id_column.upper()].to_numpy()}, geometry=geometry, crs="EPSG:4326")
+
+
+def current_boundaries():
+    """The wards in ward_boundaries_20251117."""
+    from map_component import load_ward_geometry
+
+    return load_ward_geometry()[["ward", "geometry"]]
+
+
+def boundaries_key(wards):
+    """Fingerprint of a boundary set, for caching its crosswalks."""
+    digest = hashlib.sha1()
+    digest.update(np.asarray(wards["ward"]).tobytes())
+    for blob in shapely.to_wkb(wards.geometry.values):
+        digest.update(blob)
+    return digest.hexdigest()[:16]
+
+
+def overlap_areas(source, target):
+    """(source index, target index, overlap area m²) for every overlapping pair."""
+    crs = source.estimate_utm_crs()
+    # cleaned coverages: overlaps within a set would count the same area twice
+    s = simplify_coverage(source.to_crs(crs).geometry.values, 0, -1)
+    t = simplify_coverage(target.to_crs(crs).geometry.values, 0, -1)
+
+    s_idx, t_idx = shapely.STRtree(t).query(s, predicate="intersects")
+    areas = shapely.area(shapely.intersection(s[s_idx], t[t_idx]))
+    keep = areas > 0  # neighbours that only share a border
+    return pd.DataFrame({
+        "source": s_idx[keep],
+        "target": t_idx[keep],
+        "area": areas[keep],
+        "source_area": shapely.area(s)[s_idx[keep]],
+    })
+
+
+class Crosswalk:
+    def __init__(self, source, target):
+        self.source_ids = np.asarray(source["ward"])
+        self.target_ids = np.asarray(target["ward"])
+
+        parts = [boundaries_key(source), boundaries_key(target)]
+        pairs = cache.single_flight(
+            "crosswalk", parts, current_generation(get_engine()),
+            lambda: overlap_areas(source, target),
+        )
+        self.pairs = pairs
+        self.weights = sparse.csr_matrix(
+            (pairs["area"] / pairs["source_area"], (pairs["target"], pairs["source"])),
+            shape=(len(self.target_ids), len(self.source_ids)),
+        )
+
+    def coverage(self):
+        """Share of each source ward's area that lands in some target ward (1 = all of it)."""
+        return pd.Series(np.asarray(self.weights.sum(axis=0)).ravel(), index=self.source_ids, name="coverage")
+
+    def matrix(self):
+        """The weights as a target x source DataFrame."""
+        return pd.DataFrame(self.weights.toarray(), index=self.target_ids, columns=self.source_ids)
+
+    def reaggregate(self, table, ward_column="ward_number", columns=None):
+        """table's counts re-aggregated onto the target wards.
+
+        columns defaults to the numeric columns that look like counts (see NOT_COUNTS).
+        Any other column (age_group, gender, income_group...) is a category, kept as is.
+        """
+        table = table.dropna(axis=1, how="all")  # columns never filled in (ward_population.density)
+        if columns is None:
+            columns = [
+                c for c in table.select_dtypes("number").columns
+                if c != ward_column and not any(hint in c for hint in NOT_COUNTS)
+            ]
+        numeric = set(table.select_dtypes("number").columns)
+        categories = [c for c in table.columns if c != ward_column and c not in numeric]
+
+        if categories:
+            wide = table.pivot_table(index=ward_column, columns=categories, values=columns, aggfunc="sum")
+        else:
+            wide = table.groupby(ward_column)[columns].sum()
+        wide = wide.reindex(self.source_ids).fillna(0)
+
+        # every column of every category at once
+        values = self.weights @ wide.to_numpy(dtype=float)
+        result = pd.DataFrame(values, index=pd.Index(self.target_ids, name=ward_column), columns=wide.columns)
+        if categories:
+            result = result.stack(list(range(1, result.columns.nlevels)), future_stack=True)
+            result = result.dropna(how="all")
+        return result.reset_index()
+
+
+if __name__ == "__main__":
+    files = [a for a in sys.argv[1:] if a.lower().endswith(".csv")]
+    tables = [a for a in sys.argv[1:] if not a.lower().endswith(".csv")]
+    if not files:
+        print("usage: python app/interpolation.py OLD.csv [NEW.csv] [table ...]")
+        sys.exit(1)
+
+    source = read_boundaries(files[0])
+    target = read_boundaries(files[1]) if len(files) > 1 else current_boundaries()
+    crosswalk = Crosswalk(source, target)
+
+    print(f"{len(crosswalk.pairs)} overlapping pairs, "
+          f"{crosswalk.weights.nnz} of {crosswalk.weights.shape[0] * crosswalk.weights.shape[1]} weights non-zero")
+    print("\nshare of each source ward in each target ward (rows: target)")
+    print(crosswalk.matrix().round(3).replace(0, "").to_string())
+    print("\nsource area covered:", f"{crosswalk.coverage().min():.4f} - {crosswalk.coverage().max():.4f}")
+
+    engine = get_engine()
+    for table in tables:
+        df = pd.read_sql_table(table, engine)
+        result = crosswalk.reaggregate(df)
+        print(f"\n{table}")
+        print(result.round(1).to_string(index=False, max_rows=40))
@@ -0,0 +1,200 @@
+# Background jobs for the long-running analyses (the station anomaly scan so far).
+#
+# A job runs in a process of its own, spawned fresh rather than forked - a worker's other
+# threads may hold locks at the moment of a fork, which the copy would never see released
+# - and records its state - status, progress, the stage it is at - in a diskcache store
+# under JOBS_DIR: no broker to run. Jobs are shared: a job is identified by what it computes (for a curated set,
+# the set and the data generation), and submitting one that is already running attaches
+# to that run instead of starting another - whichever visitor, worker or re-selection
+# asks. The browser polls the job every JOB_POLL_MS and picks the result up from the
+# job's record once it is done - whether or not the shared cache kept it.
+#
+# Every visitor polling a job counts as watching it. Cancelling - or picking something
+# else - only detaches that visitor; the job stops once nobody watches it any more: at
+# once when the last watcher detaches, or at its next stage when the watchers simply
+# stopped polling for JOB_IDLE_SECONDS (the tab was closed). Stopping a job ends its
+# process and cancels the query it has running, found by the job's application_name.
+#
+#   python app/jobs.py              # job store location and the jobs in it
+
+import hashlib
+import multiprocessing
+import os
+import signal
+import time
+from pathlib import Path
+
+import diskcache
+import psutil
+from sqlalchemy import text
+
+from cache import CACHE_DIR
+
+JOBS_DIR = Path(os.getenv("JOBS_DIR", CACHE_DIR / "jobs"))
+JOB_POLL_MS = int(os.getenv("JOB_POLL_MS", "500"))
+JOB_IDLE_SECONDS = float(os.getenv("JOB_IDLE_SECONDS", "10"))
+
+RUNNING = ("starting", "running")
+
+_store = None
+_job = None  # in a job's own process: (job id, its stages)
+
+
+class JobAbandoned(Exception):
+    """Nobody is watching the job any more."""
+
+
+def get_store():
+    global _store
+    if _store is None:
+        JOBS_DIR.mkdir(parents=True, exist_ok=True)
+        _store = diskcache.Cache(str(JOBS_DIR))
+    return _store
+
+
+def _alive(state):
+    if state is None or state["status"] not in RUNNING:
+        return False
+    if state["pid"] is None:  # being started right now
+        return time.time() - state["updated"] < JOB_IDLE_SECONDS
+    try:
+        return psutil.Process(state["pid"]).status() != psutil.STATUS_ZOMBIE
+    except psutil.NoSuchProcess:
+        return False
+
+
+def job_tag(job_id):
+    """The application_name of the job's queries (63 bytes at most)."""
+    return f"job:{hashlib.sha1(job_id.encode()).hexdigest()[:16]}"
+
+
+def _update(job_id, **fields):
+    store = get_store()
+    with store.transact():
+        state = store.get(("job", job_id))
+        if state is not None:
+            store.set(("job", job_id), {**state, **fields, "updated": time.time()})
+
+################################################# SUBMITTING & WATCHING #############################################
+
+def submit(name, key, target, args, stages, watcher):
+    """Start target(*args) as job name:key, or attach to the run of it already going.
+
+    target must be a module-level function (the job imports it afresh) and args
+    picklable. stages are the labels the job reports its progress by (see stage());
+    watcher identifies the visitor, who watches the job from now on. Returns the job id.
+    """
+    store = get_store()
+    job_id = f"{name}:{key}"
+    multiprocessing.active_children()  # reap this worker's finished jobs
+
+    with store.transact():
+        start = not _alive(store.get(("job", job_id)))
+        if start:
+            store.set(("job", job_id), {
+                "status": "starting", "pid": None, "stage": stages[0], "progress": 0,
+                "watchers": {}, "started": time.time(), "updated": time.time(),
+            })
+    watch(job_id, watcher)
+    if start:
+        process = multiprocessing.get_context("spawn").Process(
+            target=_run, args=(job_id, target, args, stages), daemon=False,
+        )
+        process.start()
+        with store.transact():
+            state = store.get(("job", job_id))
+            state["pid"] = process.pid
+            if state["status"] == "starting":  # unless it is already done
+                state["status"] = "running"
+            store.set(("job", job_id), state)
+    return job_id
+
+
+def watch(job_id, watcher):
+    """The job's state ({status, stage, progress, ...}, None if unknown), noting that
+    watcher still follows it."""
+    store = get_store()
+    multiprocessing.active_children()
+    with store.transact():
+        state = store.get(("job", job_id))
+        if state is None:
+            return None
+        if state["status"] in RUNNING and not _alive(state):
+            state["status"] = "failed"  # the process died without a word
+        state["watchers"][watcher] = time.time()
+        store.set(("job", job_id), state)
+    return state
+
+
+def detach(job_id, watcher):
+    """Stop watching the job; the last watcher to detach stops it."""
+    store = get_store()
+    with store.transact():
+        state = store.get(("job", job_id))
+        if state is None:
+            return
+        state["watchers"].pop(watcher, None)
+        stop = _alive(state) and not state["watchers"]
+        if stop:
+            state["status"] = "cancelled"
+        store.set(("job", job_id), state)
+    if not stop:
+        return
+    if state["pid"] is not None:
+        try:
+            os.kill(state["pid"], signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+    # Postgres would finish the query of a process that is gone
+    from db import get_engine
+    try:
+        with get_engine().connect() as conn:
+            conn.execute(text("""
+                SELECT pg_cancel_backend(pid) FROM pg_stat_activity
+                WHERE application_name = :tag AND pid <> pg_backend_pid()
+            """), {"tag": job_tag(job_id)})
+    except Exception as e:
+        print(f"Could not cancel the query of job {job_id}: {e}")
+
+################################################# INSIDE A JOB #############################################
+
+def _run(job_id, target, args, stages):
+    global _job
+    _job = (job_id, stages)
+    import resilience
+    resilience.tag_process(job_tag(job_id))
+
+    try:
+        result = target(*args)
+        _update(job_id, status="done", stage="Done", progress=100, result=result)
+    except JobAbandoned:
+        _update(job_id, status="cancelled")
+    except Exception as e:
+        print(f"Job {job_id} failed: {e}")
+        _update(job_id, status="failed", error=str(e))
+
+
+def stage(label):
+    """Report that the current job has reached stage label - a no-op outside a job, and
+    for labels that aren't one of the job's stages. Raises JobAbandoned once nobody has
+    watched the job for JOB_IDLE_SECONDS."""
+    if _job is None:
+        return
+    job_id, stages = _job
+    if label not in stages:
+        return
+    state = get_store().get(("job", job_id))
+    if state is None or state["status"] == "cancelled" or \
+            all(time.time() - seen > JOB_IDLE_SECONDS for seen in state["watchers"].values()):
+        raise JobAbandoned()
+    _update(job_id, stage=label, progress=int(100 * stages.index(label) / len(stages)))
+
+
+if __name__ == "__main__":
+    store = get_store()
+    print(f"job store: {JOBS_DIR} ({len(store)} entries, {store.volume() // 1024} KB)")
+    for key in store.iterkeys():
+        if isinstance(key, tuple) and key[0] == "job":
+            state = store[key]
+            print(f"  {key[1]}: {state['status']} at {state['stage']} ({state['progress']}%), "
+                  f"{len(state['watchers'])} watching")
@@ -1,146 +1,302 @@
+# Ward map - a native Plotly choropleth of the wards, coloured by a ward metric.
+#
+# The figure never carries geometry: its GeoJSON is a URL into the boundary pyramid
+# (/geometry/wards.geojson, see boundaries.py), which the browser fetches and caches on
+# its own. Everything else is a per-ward array - the coloured metric, plus the hover
+# values as customdata - so switching the metric re-sends 14 numbers, and zooming past a
+# pyramid level only swaps the GeoJSON URL. Being a dcc.Graph, ward clicks reach Dash
+# callbacks like any other figure.
+#
+# The wards can be coloured by any metric of the ward feature matrix. The colour classes
+# are quantile bins, worked out for every metric at once per data generation
+# (metric_scales) and shipped with the page, where assets/ward_map.js restyles the
+# figure from them - switching the metric doesn't reach the server at all.
+#
+# Beside it, ward_cluster_figure maps the metric's LISA clusters (spatial.py): wards
+# significantly alike or unlike their neighbours, from the adjacency stored by the loader.
+# Those are worked out for every metric along with the colour classes, and restyled by
+# the same script.
+#
+#   python app/map_component.py          # colour classes per metric and the payload sizes
+
 import geopandas as gpd
+import numpy as np
 import pandas as pd
-import folium
+import plotly.graph_objects as go
+from plotly.colors import sample_colorscale
 from shapely import wkt
-from dash import html
-import os
-from sqlalchemy import create_engine
-
-# Reuse the same database configuration as app.py
-DATABASE_URL = os.getenv(
-    "DATABASE_URL",
-    "postgresql+psycopg2://appuser:app_password@db:5432/calgary_ward_db",
-)
-
-# Create a single engine instance to be reused
-_engine = None
-
-def get_engine():
-    """Get or create the database engine singleton."""
-    global _engine
-    if _engine is None:
-        _engine = create_engine(DATABASE_URL)
-    return _engine
-
-def generate_ward_map():
-    engine = get_engine()
-
-    # Load geometry table
-    wards = pd.read_sql("""
-        SELECT "WARD_NUM", "MULTIPOLYGON", "COUNCILLOR", "LABEL"
-        FROM ward_boundaries_20251117;
-    """, con=engine)
-
-    if wards.empty:
-        print("WARNING: ward_boundaries_20251117 is empty.")
-        return
-
-    wards["geometry"] = wards["MULTIPOLYGON"].apply(wkt.loads)
-    wards.rename(columns={"WARD_NUM": "ward"}, inplace=True)
-
-    # Population
-    population = pd.read_sql("""
-        SELECT ward_number, total AS population
-        FROM ward_population;
-    """, con=engine).rename(columns={"ward_number": "ward"})
-
-    # Crime
-    crime = pd.read_sql("""
-        SELECT ward_number, total AS total_crime
-        FROM ward_crime;
-    """, con=engine).rename(columns={"ward_number": "ward"})
-
-    # Disorder
-    disorder = pd.read_sql("""
-        SELECT ward_number, total AS total_disorder
-        FROM ward_disorder;
-    """, con=engine).rename(columns={"ward_number": "ward"})
-
-    # Community services
-    services = pd.read_sql("""
-        SELECT ward_number, SUM(count) AS services
-        FROM community_services
-        GROUP BY ward_number;
-    """, con=engine).rename(columns={"ward_number": "ward"})
-
-    # Turnout
-    turnout = pd.read_sql("""
-        SELECT
-            vs.ward_number AS ward,
-            COALESCE(SUM(er.votes), 0) AS total_votes
-        FROM voting_station vs
-        LEFT JOIN election_result er ON vs.station_code = er.station_code
-        GROUP BY vs.ward_number;
-    """, con=engine)
-
-    # Merge all tables safely
-    merged = (
-        wards
-        .merge(population, on="ward", how="left")
-        .merge(turnout, on="ward", how="left")
-        .merge(crime, on="ward", how="left")
-        .merge(disorder, on="ward", how="left")
-        .merge(services, on="ward", how="left")
-    )
+from dash import dcc
+
+# Reuse the same pooled engine as app.py
+import boundaries
+import offline
+from db import get_engine
+from features import SHARE_PREFIX, share_label, ward_features
+from generation import current_generation, on_generation_change
+import spatial
+
+MAP_CENTER = {"lat": 51.05, "lon": -114.07}
+MAP_ZOOM = 10
+MAP_COLORSCALE = "YlGnBu"
+MAP_CLASSES = 5
+
+# metrics the wards can be coloured by - plus the vote share of each top mayoral
+# candidate, whoever they are in the loaded data (see map_metrics)
+MAP_METRICS = {
+    "population": "Population",
+    "turnout_rate": "Turnout Rate (%)",
+    "total_votes": "Total Votes",
+    "winning_margin": "Winning Margin",
+    "total_crime": "Total Crime",
+    "crime_rate": "Crime Rate (per 1,000)",
+    "total_disorder": "Total Disorder",
+    "disorder_rate": "Disorder Rate (per 1,000)",
+    "avg_income": "Average Income",
+    "avg_employment_rate": "Employment Rate (%)",
+    "total_labour_force": "Labour Force",
+    "postsecondary_pct": "Post-Secondary Education (%)",
+    "total_services": "Community Services",
+    "total_recreation": "Recreation Facilities",
+    "active_stops": "Transit Stops",
+    "transit_commuters": "Public Transit Users",
+    "stations_per_10k": "Voting Stations per 10,000",
+    "qol_index": "Quality of Life Index",
+    "age_under_20_pct": "Aged under 20 (%)",
+    "age_20_39_pct": "Aged 20-39 (%)",
+    "age_40_59_pct": "Aged 40-59 (%)",
+    "age_60_plus_pct": "Aged 60+ (%)",
+    "female_pct": "Female (%)",
+}
+DEFAULT_METRIC = "population"
+
+# shown on hover and in the ward details, whatever the map is coloured by
+HOVER_METRICS = ["population", "turnout_rate", "total_crime", "total_disorder", "total_services"]
+
+# one colour per spatial.CLUSTERS entry
+CLUSTER_COLORS = ["#e0e0e0", "#d7191c", "#abd9e9", "#2c7bb6", "#fdae61"]
+
+# Read-only state kept for the life of the process (preloaded before workers fork)
+_ward_geometry = None
+_scales = None
+_scales_generation = None
+
+def load_ward_geometry():
+    """Ward boundary polygons, parsed once per process."""
+    global _ward_geometry
+    if _ward_geometry is None:
+        wards = pd.read_sql("""
+            SELECT "WARD_NUM", "MULTIPOLYGON", "COUNCILLOR", "LABEL"
+            FROM ward_boundaries_20251117;
+        """, con=get_engine())
+
+        wards["geometry"] = wards["MULTIPOLYGON"].apply(wkt.loads)
+        wards = wards.drop(columns="MULTIPOLYGON").rename(columns={"WARD_NUM": "ward"})
+        _ward_geometry = gpd.GeoDataFrame(wards, geometry="geometry", crs="EPSG:4326")
+    return _ward_geometry
 
-    # Compute turnout percentage
+
+@on_generation_change
+def _clear_geometry(old, new):
+    global _ward_geometry
+    if old is not None:
+        _ward_geometry = None
+
+
+def map_metrics():
+    """{metric: label} for every metric the map offers: MAP_METRICS, with the feature
+    matrix's mayoral vote shares after the election results."""
+    shares = {
+        column: share_label(column)
+        for column in ward_features(get_engine()).columns if column.startswith(SHARE_PREFIX)
+    }
+    metrics = {}
+    for metric, label in MAP_METRICS.items():
+        metrics[metric] = label
+        if metric == "winning_margin":
+            metrics.update(shares)
+    return metrics
+
+
+def ward_table():
+    """One row per ward: ward, COUNCILLOR and every map_metrics() column, taken from the
+    ward feature matrix (features.py) - already in memory unless the data has just been
+    reloaded."""
+    features = ward_features(get_engine())
+    metrics = features.reindex(columns=list(map_metrics())).rename_axis("ward").reset_index()
+    wards = load_ward_geometry()[["ward", "COUNCILLOR"]]
+    merged = wards.merge(metrics, on="ward", how="left")
+
+    # the map's turnout has always counted the votes of every race, not only the mayoral one
     merged["turnout_rate"] = (
         (merged["total_votes"] / merged["population"]) * 100
     ).fillna(0).round(1)
+    return merged.sort_values("ward").reset_index(drop=True)
+
+
+def format_value(value):
+    if pd.isna(value):
+        return "n/a"
+    return f"{value:,.0f}" if abs(value) >= 1000 else f"{value:,.3g}"
+
+
+def color_scale(values, classes=MAP_CLASSES):
+    """Quantile colour classes for one metric's per-ward values, as the trace and
+    colorbar properties that draw them.
 
-    # Build GeoDataFrame
-    gdf = gpd.GeoDataFrame(merged, geometry="geometry", crs="EPSG:4326")
-
-    # Generate Folium map
-    m = folium.Map(location=[51.05, -114.07], zoom_start=10, tiles="cartodbpositron")
-
-    folium.GeoJson(
-        gdf,
-        tooltip=folium.GeoJsonTooltip(
-            fields=[
-                "ward",
-                "COUNCILLOR",
-                "population",
-                "turnout_rate",
-                "total_crime",
-                "total_disorder",
-                "services",
-            ],
-            aliases=[
-                "Ward:",
-                "Councillor:",
-                "Population:",
-                "Turnout Rate (%):",
-                "Total Crime:",
-                "Total Disorder:",
-                "Community Services:",
-            ],
-            localize=True,
-            sticky=True,
+    z holds each ward's class index and the colorscale is stepped, one flat colour per
+    class, so the colorbar reads as a legend of the class ranges. Wards without a value
+    get no class and are left undrawn.
+    """
+    values = np.asarray(values, dtype=float)
+    present = values[~np.isnan(values)]
+    edges = np.unique(np.quantile(present, np.linspace(0, 1, classes + 1))) if present.size else np.zeros(1)
+    if edges.size == 1:
+        edges = np.repeat(edges, 2)
+    k = edges.size - 1
+    z = np.clip(np.searchsorted(edges, values, side="right") - 1, 0, k - 1)
+
+    colors = sample_colorscale(MAP_COLORSCALE, np.linspace(0.1, 1, k).tolist())
+    colorscale = []
+    for i, color in enumerate(colors):
+        colorscale += [[i / k, color], [(i + 1) / k, color]]
+    return {
+        "z": [None if np.isnan(v) else int(c) for v, c in zip(values, z)],
+        "zmin": -0.5,
+        "zmax": k - 0.5,
+        "colorscale": colorscale,
+        "tickvals": list(range(k)),
+        "ticktext": [f"{format_value(lo)} - {format_value(hi)}" for lo, hi in zip(edges[:-1], edges[1:])],
+        "text": [format_value(v) for v in values],
+    }
+
+
+def cluster_scale(metric, label):
+    """The LISA cluster trace properties for one metric: {locations, z, customdata,
+    hovertemplate, moran}, where moran is spatial.ward_clusters' summary (or None)."""
+    result = spatial.ward_clusters(metric)
+    wards = result["wards"]
+    return {
+        "locations": wards["ward"].tolist(),
+        "z": wards["cluster"].tolist(),
+        "customdata": [
+            [row.label, format_value(row.value), format_value(row.lag), None if pd.isna(row.p_sim) else round(row.p_sim, 3)]
+            for row in wards.itertuples()
+        ],
+        "hovertemplate": (
+            "<b>Ward %{location}</b><br>%{customdata[0]}<br>"
+            f"{label}: %{{customdata[1]}}<br>"
+            "Neighbours' average: %{customdata[2]}<br>"
+            "p = %{customdata[3]}<extra></extra>"
         ),
-        style_function=lambda x: {
-            "color": "black",
-            "weight": 1,
-            "fillColor": "#66c2a5",
-            "fillOpacity": 0.55,
-        },
-    ).add_to(m)
+        "moran": result["moran"],
+    }
+
+
+def metric_scales():
+    """{metric: {title, z, zmin, zmax, colorscale, tickvals, ticktext, text, clusters}}
+    for every map_metrics() metric, computed once per data generation. clusters is the
+    metric's cluster_scale."""
+    global _scales, _scales_generation
+
+    generation = current_generation(get_engine())
+    if _scales is None or _scales_generation != generation:
+        wards = ward_table()
+        _scales = {
+            metric: {"title": label, **color_scale(wards[metric]), "clusters": cluster_scale(metric, label)}
+            for metric, label in map_metrics().items()
+        }
+        _scales_generation = generation
+    return _scales
+
+
+def geometry_url(zoom):
+    """The pyramid level for zoom, as the URL the figure's GeoJSON is fetched from.
+
+    The URL names the level's own min_zoom rather than zoom itself, so every zoom within
+    a level shares one URL - and one browser cache entry. It also names the data
+    generation: the geometry is cached for GEOMETRY_MAX_AGE without revalidating, so
+    reloaded boundaries need a new URL.
+    """
+    generation = current_generation(get_engine())
+    levels = boundaries.load_layer("wards")
+    level_zoom = boundaries.level_for_zoom(levels, zoom)["min_zoom"] if levels else 0
+    return f"/geometry/wards.geojson?zoom={level_zoom}&g={generation}"
+
 
-    m.save("ward_map.html")
-    print("Saved ward_map.html")
+def hovertemplate():
+    lines = ["<b>Ward %{location}</b>", "Councillor: %{customdata[0]}"]
+    lines += [f"{MAP_METRICS[m]}: %{{customdata[{i}]:,}}" for i, m in enumerate(HOVER_METRICS, start=1)]
+    return "<br>".join(lines) + "<extra>%{text}</extra>"
+
+
+def ward_map_figure(metric=DEFAULT_METRIC):
+    wards = ward_table()
+    scale = metric_scales()[metric]
+    fig = go.Figure(go.Choroplethmap(
+        geojson=geometry_url(MAP_ZOOM),
+        featureidkey="id",
+        locations=wards["ward"],
+        z=scale["z"],
+        zmin=scale["zmin"],
+        zmax=scale["zmax"],
+        colorscale=scale["colorscale"],
+        colorbar=dict(title=dict(text=scale["title"]), tickvals=scale["tickvals"], ticktext=scale["ticktext"]),
+        marker=dict(opacity=0.7, line=dict(color="black", width=1)),
+        # the coloured metric's value, shown beside the hover box
+        text=scale["text"],
+        customdata=wards[["COUNCILLOR", *HOVER_METRICS]],
+        hovertemplate=hovertemplate(),
+    ))
+    fig.update_layout(
+        map=dict(style=offline.map_style(), center=MAP_CENTER, zoom=MAP_ZOOM),
+        margin=dict(l=0, r=0, t=0, b=0),
+        height=600,
+        # keep the visitor's pan and zoom when the metric or geometry level changes
+        uirevision="ward-map",
+    )
+    return fig
+
+
+def ward_cluster_figure(metric=DEFAULT_METRIC):
+    """The wards coloured by their LISA cluster for metric (spatial.ward_clusters)."""
+    clusters = metric_scales()[metric]["clusters"]
+    k = len(spatial.CLUSTERS)
+    colorscale = []
+    for i, color in enumerate(CLUSTER_COLORS):
+        colorscale += [[i / k, color], [(i + 1) / k, color]]
+
+    fig = go.Figure(go.Choroplethmap(
+        geojson=geometry_url(MAP_ZOOM),
+        featureidkey="id",
+        locations=clusters["locations"],
+        z=clusters["z"],
+        zmin=-0.5,
+        zmax=k - 0.5,
+        colorscale=colorscale,
+        colorbar=dict(title=dict(text="LISA cluster"), tickvals=list(range(k)), ticktext=spatial.CLUSTERS),
+        marker=dict(opacity=0.7, line=dict(color="black", width=1)),
+        customdata=clusters["customdata"],
+        hovertemplate=clusters["hovertemplate"],
+    ))
+    fig.update_layout(
+        map=dict(style=offline.map_style(), center=MAP_CENTER, zoom=MAP_ZOOM - 0.5),
+        margin=dict(l=0, r=0, t=0, b=0),
+        height=450,
+        uirevision="ward-clusters",
+    )
+    return fig
 
 
 def ward_map_component():
-    try:
-        src = open("ward_map.html", "r").read()
-    except FileNotFoundError:
-        generate_ward_map()
-        src = open("ward_map.html", "r").read()
-
-    return html.Iframe(
-        id="ward-map",
-        srcDoc=src,
-        width="100%",
-        height="600",
-        style={"border": "none", "borderRadius": "8px"},
-    )
\ No newline at end of file
+    # filled in by a callback when the page loads, so it always shows the current data
+    return dcc.Graph(id="ward-map", config={"scrollZoom": True, "displayModeBar": False})
+
+
+if __name__ == "__main__":
+    import json
+
+    scales = metric_scales()
+    for metric, scale in scales.items():
+        print(f"{metric:22} " + " | ".join(scale["ticktext"]))
+    print(f"figure {len(ward_map_figure().to_json()) // 1024} KB, geometry from {geometry_url(MAP_ZOOM)}")
+    print(f"colour classes and clusters for all {len(scales)} metrics {len(json.dumps(scales)) // 1024} KB")
@@ -0,0 +1,201 @@
+# Serving the map - basemap included - and the page's stylesheet from the app itself,
+# for deployments without internet access.
+#
+# With MAP_ASSETS=local the page fetches nothing from elsewhere:
+#   basemap     raster tiles of the Calgary extent, pre-rendered into an MBTiles file
+#               (OFFLINE_DIR/calgary.mbtiles) and served at /basemap/<z>/<x>/<y>.<format>,
+#               described by a MapLibre style at /basemap/style.json. Without the file the
+#               wards are drawn on a plain background.
+#   stylesheet  the Bootstrap theme, from OFFLINE_DIR/bootstrap.min.css
+# Plotly (MapLibre included) and Dash's own scripts are always served by Dash.
+#
+# Tiles, the stylesheet and everything under app/assets are served with long-lived cache
+# headers; the stylesheet and assets URLs carry their file's mtime, so a new copy is
+# still picked up at once.
+#
+# The bundle is built on a machine with internet access and copied into OFFLINE_DIR:
+#   python app/offline.py fetch [max zoom]   # tiles for zoom 9 to max zoom (14), and the stylesheet
+#   python app/offline.py                    # what the bundle holds
+
+import math
+import os
+import sqlite3
+import threading
+import urllib.request
+from pathlib import Path
+
+import dash_bootstrap_components as dbc
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+MAP_ASSETS = os.getenv("MAP_ASSETS", "cdn")
+OFFLINE_DIR = Path(os.getenv("OFFLINE_DIR", BASE_DIR / "offline"))
+ASSET_MAX_AGE = int(os.getenv("ASSET_MAX_AGE", str(30 * 24 * 3600)))
+
+MBTILES_PATH = OFFLINE_DIR / "calgary.mbtiles"
+STYLESHEET_PATH = OFFLINE_DIR / "bootstrap.min.css"
+
+# the ward boundaries' extent, padded a little (west, south, east, north)
+CALGARY_BOUNDS = (-114.35, 50.82, -113.82, 51.24)
+TILE_URL = os.getenv("BASEMAP_TILE_URL", "https://basemaps.cartocdn.com/light_all/{z}/{x}/{y}.png")
+TILE_ATTRIBUTION = "© OpenStreetMap contributors © CARTO"
+TILE_MIN_ZOOM = 9
+TILE_MAX_ZOOM = 14
+
+TILE_TYPES = {"png": "image/png", "jpg": "image/jpeg", "webp": "image/webp"}
+
+_local = threading.local()
+
+
+def local_assets():
+    return MAP_ASSETS == "local"
+
+
+def _version(path):
+    return int(path.stat().st_mtime) if path.exists() else 0
+
+################################################# STYLESHEET #############################################
+
+def stylesheet():
+    """The Bootstrap theme's URL: the bundled copy in local mode, the CDN otherwise."""
+    if local_assets() and STYLESHEET_PATH.exists():
+        return f"/offline/{STYLESHEET_PATH.name}?v={_version(STYLESHEET_PATH)}"
+    return dbc.themes.BOOTSTRAP
+
+################################################# BASEMAP #############################################
+
+def _tiles():
+    # one read-only connection per thread, reopened when a new bundle is copied in
+    version = tiles_version()
+    if getattr(_local, "version", None) != version:
+        _local.conn = sqlite3.connect(f"file:{MBTILES_PATH}?mode=ro", uri=True)
+        _local.version = version
+    return _local.conn
+
+
+def metadata():
+    """The MBTiles metadata (format, bounds, minzoom, maxzoom...), or None without a file."""
+    if not MBTILES_PATH.exists():
+        return None
+    return dict(_tiles().execute("SELECT name, value FROM metadata").fetchall())
+
+
+def tile(z, x, y):
+    """One tile's bytes, or None outside the pre-rendered extent."""
+    # MBTiles rows count from the south (TMS), web map tiles from the north
+    row = _tiles().execute(
+        "SELECT tile_data FROM tiles WHERE zoom_level = ? AND tile_column = ? AND tile_row = ?",
+        (z, x, (1 << z) - 1 - y),
+    ).fetchone()
+    return row[0] if row else None
+
+
+def tiles_version():
+    return _version(MBTILES_PATH)
+
+
+def map_style():
+    """The figure's map.style: the carto basemap normally, the local one in local mode."""
+    if not local_assets():
+        return "carto-positron"
+    # white-bg is built into Plotly and fetches nothing
+    return "/basemap/style.json" if MBTILES_PATH.exists() else "white-bg"
+
+
+def basemap_style(root):
+    """MapLibre style for the local tiles; root is the app's absolute URL (MapLibre wants
+    absolute tile URLs)."""
+    meta = metadata()
+    return {
+        "version": 8,
+        "sources": {
+            "basemap": {
+                "type": "raster",
+                "tiles": [f"{root}basemap/{{z}}/{{x}}/{{y}}.{meta['format']}"],
+                "tileSize": 256,
+                "minzoom": int(meta["minzoom"]),
+                "maxzoom": int(meta["maxzoom"]),
+                "bounds": [float(v) for v in meta["bounds"].split(",")],
+                "attribution": meta.get("attribution", ""),
+            },
+        },
+        "layers": [
+            {"id": "background", "type": "background", "paint": {"background-color": "#fafaf8"}},
+            {"id": "basemap", "type": "raster", "source": "basemap"},
+        ],
+    }
+
+################################################# BUILDING THE BUNDLE #############################################
+
+def tile_range(z, bounds=CALGARY_BOUNDS):
+    """(x0, x1, y0, y1) of the web map tiles covering bounds at zoom z, inclusive."""
+    west, south, east, north = bounds
+    n = 1 << z
+
+    def x(lon):
+        return int((lon + 180) / 360 * n)
+
+    def y(lat):
+        lat = math.radians(lat)
+        return int((1 - math.asinh(math.tan(lat)) / math.pi) / 2 * n)
+
+    return x(west), x(east), y(north), y(south)
+
+
+def fetch_tiles(max_zoom=TILE_MAX_ZOOM, url=TILE_URL):
+    """Download the CALGARY_BOUNDS tiles from url into MBTILES_PATH (replacing it)."""
+    OFFLINE_DIR.mkdir(parents=True, exist_ok=True)
+    partial = MBTILES_PATH.with_name(f".{MBTILES_PATH.name}.tmp")
+    partial.unlink(missing_ok=True)
+    conn = sqlite3.connect(partial)
+    conn.executescript("""
+        CREATE TABLE metadata (name TEXT, value TEXT);
+        CREATE TABLE tiles (zoom_level INTEGER, tile_column INTEGER, tile_row INTEGER, tile_data BLOB);
+        CREATE UNIQUE INDEX tile_index ON tiles (zoom_level, tile_column, tile_row);
+    """)
+    fmt = url.rsplit(".", 1)[-1].lower()
+    conn.executemany("INSERT INTO metadata VALUES (?, ?)", [
+        ("name", "Calgary basemap"),
+        ("format", "jpg" if fmt == "jpeg" else fmt),
+        ("bounds", ",".join(str(v) for v in CALGARY_BOUNDS)),
+        ("minzoom", str(TILE_MIN_ZOOM)),
+        ("maxzoom", str(max_zoom)),
+        ("attribution", TILE_ATTRIBUTION),
+    ])
+
+    headers = {"User-Agent": "calgary-ward-dashboard offline bundle"}
+    for z in range(TILE_MIN_ZOOM, max_zoom + 1):
+        x0, x1, y0, y1 = tile_range(z)
+        for x in range(x0, x1 + 1):
+            for y in range(y0, y1 + 1):
+                request = urllib.request.Request(url.format(z=z, x=x, y=y), headers=headers)
+                with urllib.request.urlopen(request, timeout=30) as response:
+                    data = response.read()
+                conn.execute("INSERT INTO tiles VALUES (?, ?, ?, ?)", (z, x, (1 << z) - 1 - y, data))
+        conn.commit()
+        print(f"zoom {z}: {(x1 - x0 + 1) * (y1 - y0 + 1)} tiles")
+    conn.close()
+    os.replace(partial, MBTILES_PATH)
+
+
+def fetch_stylesheet():
+    OFFLINE_DIR.mkdir(parents=True, exist_ok=True)
+    with urllib.request.urlopen(dbc.themes.BOOTSTRAP, timeout=30) as response:
+        STYLESHEET_PATH.write_bytes(response.read())
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) > 1 and sys.argv[1] == "fetch":
+        fetch_tiles(int(sys.argv[2]) if len(sys.argv) > 2 else TILE_MAX_ZOOM)
+        fetch_stylesheet()
+    print(f"mode: {MAP_ASSETS}, bundle: {OFFLINE_DIR}")
+    meta = metadata()
+    if meta:
+        count = _tiles().execute("SELECT COUNT(*) FROM tiles").fetchone()[0]
+        print(f"basemap: {count} tiles, zoom {meta['minzoom']}-{meta['maxzoom']}, "
+              f"{MBTILES_PATH.stat().st_size // 1024} KB")
+    else:
+        print("basemap: none (the map is drawn on a plain background)")
+    print(f"stylesheet: {STYLESHEET_PATH if STYLESHEET_PATH.exists() else 'none (served from the CDN)'}")
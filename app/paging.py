@@ -0,0 +1,377 @@
+# Server-side paging, filtering and sorting for the Data View table.
+#
+# The DataTable runs with page_action/filter_action/sort_action="custom": it sends its
+# filter_query, sort_by and page number, and only the requested page comes back. The
+# dataset query from the registry is wrapped as a subquery, the filter expression is
+# translated into a parameterised WHERE clause (column names are checked against the
+# dataset's columns, values are always binds), and pages are read with keyset
+# pagination - "rows after the last row of the previous page" - so page 500 costs
+# the same as page 1. The row count comes from the planner's estimate, made exact when
+# the estimate is small enough that counting is cheap.
+#
+# Results already held in memory (the SQL console's) are paged the same way by
+# frame_page: the same filter expressions and sort order, applied with pandas.
+#
+#   python app/paging.py dataset.election_result "{votes} > 500" [page]
+
+import json
+import math
+import re
+import sys
+
+import pandas as pd
+from sqlalchemy import text
+
+import queries
+from db import get_engine
+import resilience
+from generation import on_generation_change
+
+# below this many estimated rows an exact COUNT(*) is cheap enough to run
+EXACT_COUNT_LIMIT = 10000
+
+# psycopg2 type codes (Postgres type OIDs)
+NUMERIC_TYPES = {20, 21, 23, 26, 700, 701, 1700}
+DECIMAL_TYPE = 1700
+DATE_TYPES = {1082, 1114, 1184}
+
+_SQL_TOKENS = re.compile(r"'(?:[^']|'')*'|\"[^\"]*\"|--[^\n]*|\(|\)|\bORDER\s+BY\b", re.IGNORECASE)
+
+_FILTER_PART = re.compile(
+    r"^\{(?P<column>[^}]+)\}\s*"
+    r"(?P<op>[<>!]?=|[<>]|is blank|is nil|[si]?(?:eq|ne|lt|le|gt|ge|contains)|datestartswith)"
+    r"\s*(?P<value>.*)$"
+)
+
+_OPERATORS = {
+    "=": "=", "eq": "=", "!=": "<>", "ne": "<>",
+    "<": "<", "lt": "<", "<=": "<=", "le": "<=",
+    ">": ">", "gt": ">", ">=": ">=", "ge": ">=",
+}
+
+_columns = {}
+
+################################################# DATASET SHAPE #############################################
+
+def strip_order_by(sql):
+    """The query without its top-level ORDER BY (and anything after it, like LIMIT)."""
+    depth, cut = 0, None
+    for match in _SQL_TOKENS.finditer(sql):
+        token = match.group(0)
+        if token == "(":
+            depth += 1
+        elif token == ")":
+            depth -= 1
+        elif depth == 0 and token.upper().startswith("ORDER"):
+            cut = match.start()
+    return sql[:cut].rstrip() if cut is not None else sql
+
+
+def describe(query_name):
+    """[{"id", "type", "decimal"}] for the dataset's columns, read from an empty result."""
+    if query_name not in _columns:
+        query = queries.get(query_name)
+        with get_engine().connect() as conn:
+            result = conn.execute(text(f"SELECT * FROM ({strip_order_by(query.sql)}) AS src LIMIT 0"))
+            description = result.cursor.description
+        columns = []
+        for column in description:
+            if column.type_code in NUMERIC_TYPES:
+                kind = "numeric"
+            elif column.type_code in DATE_TYPES:
+                kind = "datetime"
+            else:
+                kind = "text"
+            columns.append({"id": column.name, "type": kind, "decimal": column.type_code == DECIMAL_TYPE})
+        _columns[query_name] = columns
+    return _columns[query_name]
+
+
+@on_generation_change
+def _clear_columns(old, new):
+    # a reload can change a dataset's columns
+    _columns.clear()
+
+
+def parse_key(query):
+    """[(column, descending)] from the query's "-- key:" metadata."""
+    key = []
+    for part in query.meta.get("key", "").split(","):
+        words = part.split()
+        if words:
+            key.append((words[0], len(words) > 1 and words[1].upper() == "DESC"))
+    return key
+
+################################################# FILTERS #############################################
+
+def _quote(column):
+    return '"' + column.replace('"', '""') + '"'
+
+
+def _unquote(value):
+    value = value.strip()
+    if len(value) >= 2 and value[0] == value[-1] and value[0] in "\"'`":
+        return value[1:-1].replace("\\" + value[0], value[0])
+    return value
+
+
+def _like_pattern(value):
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def _number(value, column):
+    try:
+        number = float(value)
+    except ValueError:
+        raise ValueError(f'"{value}" is not a number (column {column})') from None
+    return int(number) if number.is_integer() else number
+
+
+def parse_filter(filter_query, columns):
+    """[(column, operator, value)] from a DataTable filter_query like
+    '{votes} > 100 && {candidate_name} contains "Gondek"'."""
+    known = {c["id"] for c in columns}
+    filters = []
+    for part in (filter_query or "").split("&&"):
+        part = part.strip()
+        if not part:
+            continue
+        match = _FILTER_PART.match(part)
+        if not match:
+            raise ValueError(f"Unsupported filter: {part}")
+        column, op, value = match.group("column"), match.group("op"), _unquote(match.group("value"))
+        if column not in known:
+            raise ValueError(f"Unknown column: {column}")
+        # "i"/"s" prefixes pick case (in)sensitivity - text comparisons here are all
+        # case-insensitive for contains and exact otherwise
+        if op[0] in "si" and (op[1:] in _OPERATORS or op[1:] == "contains"):
+            op = op[1:]
+        filters.append((column, op, value))
+    return filters
+
+
+def filter_clause(filters, columns):
+    """(SQL condition, binds) for parsed filters; numeric comparisons bind numbers."""
+    kinds = {c["id"]: c["type"] for c in columns}
+    conditions, binds = [], {}
+    for i, (column, op, value) in enumerate(filters):
+        name, bind = _quote(column), f"f{i}"
+        if op in ("is blank", "is nil"):
+            conditions.append(f"({name} IS NULL OR CAST({name} AS TEXT) = '')")
+            continue
+        if op == "contains":
+            conditions.append(f"CAST({name} AS TEXT) ILIKE :{bind}")
+            binds[bind] = f"%{_like_pattern(value)}%"
+        elif op == "datestartswith":
+            conditions.append(f"CAST({name} AS TEXT) LIKE :{bind}")
+            binds[bind] = f"{_like_pattern(value)}%"
+        elif kinds[column] == "numeric":
+            conditions.append(f"{name} {_OPERATORS[op]} :{bind}")
+            binds[bind] = _number(value, column)
+        else:
+            conditions.append(f"CAST({name} AS TEXT) {_OPERATORS[op]} :{bind}")
+            binds[bind] = value
+    return " AND ".join(conditions), binds
+
+################################################# PAGES #############################################
+
+def sort_order(query, sort_by, columns):
+    """[(column, descending)]: the table's sort columns, then the dataset key (if there is a
+    query) as tie-breaker."""
+    known = {c["id"] for c in columns}
+    order = []
+    for sort in sort_by or []:
+        if sort["column_id"] not in known:
+            raise ValueError(f"Unknown column: {sort['column_id']}")
+        order.append((sort["column_id"], sort["direction"] == "desc"))
+    used = {column for column, _ in order}
+    if query is not None:
+        order += [(column, desc) for column, desc in parse_key(query) if column not in used]
+    return order
+
+
+def keyset_clause(order, bound):
+    """(SQL condition, binds) selecting rows that sort after bound (NULLS LAST)."""
+    branches, binds = [], {}
+    for i, (column, desc) in enumerate(order):
+        name = _quote(column)
+        equal = []
+        for j, (previous, _) in enumerate(order[:i]):
+            if bound[j] is None:
+                equal.append(f"{_quote(previous)} IS NULL")
+            else:
+                equal.append(f"{_quote(previous)} = :k{j}")
+                binds[f"k{j}"] = bound[j]
+        if bound[i] is None:
+            continue  # nothing sorts after NULL in this column
+        binds[f"k{i}"] = bound[i]
+        after = f"({name} {'<' if desc else '>'} :k{i} OR {name} IS NULL)"
+        branches.append("(" + " AND ".join(equal + [after]) + ")")
+    return "(" + (" OR ".join(branches) or "FALSE") + ")", binds
+
+
+def source_sql(query, columns):
+    # NUMERIC values travel as floats so keyset bounds round-trip through the browser exactly
+    select = ", ".join(
+        f"CAST({_quote(c['id'])} AS DOUBLE PRECISION) AS {_quote(c['id'])}" if c["decimal"] else _quote(c["id"])
+        for c in columns
+    )
+    return f"SELECT {select} FROM ({strip_order_by(query.sql)}) AS src"
+
+
+def ordered_sql(query, columns, filters, order, bound=None):
+    """(SQL, binds) for the filtered dataset in order, optionally starting after bound."""
+    where, binds = filter_clause(filters, columns)
+    conditions = [where] if where else []
+    if bound is not None:
+        keyset, keyset_binds = keyset_clause(order, bound)
+        conditions.append(keyset)
+        binds.update(keyset_binds)
+
+    sql = f"SELECT * FROM ({source_sql(query, columns)}) AS page_source"
+    if conditions:
+        sql += "\nWHERE " + " AND ".join(conditions)
+    sql += "\nORDER BY " + ", ".join(
+        f"{_quote(column)} {'DESC' if desc else 'ASC'} NULLS LAST" for column, desc in order
+    )
+    return sql, binds
+
+
+def page_sql(query, columns, filters, order, limit, offset=0, bound=None):
+    sql, binds = ordered_sql(query, columns, filters, order, bound)
+    sql += "\nLIMIT :page_limit"
+    binds["page_limit"] = limit
+    if offset:
+        sql += " OFFSET :page_offset"
+        binds["page_offset"] = offset
+    return sql, binds
+
+
+def _plain(value):
+    if value is None or (not isinstance(value, str) and pd.isna(value)):
+        return None
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return value.item() if hasattr(value, "item") else value
+
+
+def fetch_page(query_name, filter_query, sort_by, page, page_size, bounds=None):
+    """(rows DataFrame, bounds) for one page.
+
+    bounds maps page number -> sort values of that page's last row, as returned by earlier
+    calls; the nearest known bound before the page turns the read into a keyset scan.
+    """
+    query = queries.get(query_name)
+    columns = describe(query_name)
+    filters = parse_filter(filter_query, columns)
+    order = sort_order(query, sort_by, columns)
+    bounds = dict(bounds or {})
+
+    known = [p for p in map(int, bounds) if p < page]
+    if known:
+        nearest = max(known)
+        bound, offset = bounds[str(nearest)], (page - nearest - 1) * page_size
+    else:
+        bound, offset = None, page * page_size
+
+    sql, binds = page_sql(query, columns, filters, order, page_size, offset, bound)
+    with get_engine().connect() as conn:
+        resilience.prepare_connection(conn)
+        result = conn.execute(text(sql), binds)
+        df = pd.DataFrame.from_records(result.fetchall(), columns=list(result.keys()), coerce_float=True)
+
+    if not df.empty:
+        last = df.iloc[-1]
+        bounds[str(page)] = [_plain(last[column]) for column, _ in order]
+    return df, bounds
+
+
+def estimate_count(query_name, filter_query):
+    """(row count, exact?) for the dataset filtered by a DataTable filter_query."""
+    return count_rows(query_name, parse_filter(filter_query, describe(query_name)))
+
+
+def count_rows(query_name, filters):
+    """(row count, exact?) for the dataset filtered by parsed filters."""
+    query = queries.get(query_name)
+    columns = describe(query_name)
+    where, binds = filter_clause(filters, columns)
+    sql = f"SELECT * FROM ({source_sql(query, columns)}) AS page_source"
+    if where:
+        sql += f"\nWHERE {where}"
+
+    with get_engine().connect() as conn:
+        resilience.prepare_connection(conn)
+        plan = conn.execute(text(f"EXPLAIN (FORMAT JSON) {sql}"), binds).scalar()
+        plan = json.loads(plan) if isinstance(plan, str) else plan
+        estimate = int(plan[0]["Plan"]["Plan Rows"])
+        if estimate < EXACT_COUNT_LIMIT:
+            return conn.execute(text(f"SELECT COUNT(*) FROM ({sql}) AS counted"), binds).scalar(), True
+    return estimate, False
+
+
+def page_count(row_count, page_size):
+    return max(math.ceil(row_count / page_size), 1)
+
+################################################# IN-MEMORY RESULTS #############################################
+
+def frame_columns(df):
+    """describe() for a DataFrame."""
+    columns = []
+    for name, dtype in df.dtypes.items():
+        if pd.api.types.is_numeric_dtype(dtype) and not pd.api.types.is_bool_dtype(dtype):
+            kind = "numeric"
+        elif pd.api.types.is_datetime64_any_dtype(dtype):
+            kind = "datetime"
+        else:
+            kind = "text"
+        columns.append({"id": name, "type": kind, "decimal": False})
+    return columns
+
+
+def filter_mask(df, filters, columns):
+    """filter_clause() for a DataFrame: a boolean mask of the rows the filters keep."""
+    kinds = {c["id"]: c["type"] for c in columns}
+    compare = {"=": "eq", "<>": "ne", "<": "lt", "<=": "le", ">": "gt", ">=": "ge"}
+    mask = pd.Series(True, index=df.index)
+    for column, op, value in filters:
+        values = df[column]
+        text_values = values.astype(str).where(values.notna(), "")
+        if op in ("is blank", "is nil"):
+            mask &= values.isna() | (text_values == "")
+        elif op == "contains":
+            mask &= text_values.str.contains(value, case=False, regex=False)
+        elif op == "datestartswith":
+            mask &= text_values.str.startswith(value)
+        elif kinds[column] == "numeric":
+            mask &= getattr(values, compare[_OPERATORS[op]])(_number(value, column)).fillna(False)
+        else:
+            mask &= getattr(text_values, compare[_OPERATORS[op]])(value) & values.notna()
+    return mask
+
+
+def frame_page(df, filter_query, sort_by, page, page_size):
+    """(rows DataFrame, filtered row count) for one page of an in-memory result; without a
+    sort the rows keep the result's own order."""
+    columns = frame_columns(df)
+    filtered = df[filter_mask(df, parse_filter(filter_query, columns), columns)]
+    order = sort_order(None, sort_by, columns)
+    if order:
+        filtered = filtered.sort_values(
+            [column for column, _ in order], ascending=[not desc for _, desc in order],
+            kind="stable", na_position="last",
+        )
+    return filtered.iloc[page * page_size:(page + 1) * page_size], len(filtered)
+
+
+if __name__ == "__main__":
+    name = sys.argv[1] if len(sys.argv) > 1 else "dataset.election_result"
+    filter_query = sys.argv[2] if len(sys.argv) > 2 else ""
+    target = int(sys.argv[3]) if len(sys.argv) > 3 else 0
+
+    count, exact = estimate_count(name, filter_query)
+    print(f"{name}: {'' if exact else '~'}{count} rows")
+    bounds = {}
+    for p in range(target + 1):
+        rows, bounds = fetch_page(name, filter_query, [], p, 20, bounds)
+    print(rows.to_string())
@@ -0,0 +1,230 @@
+# Named query registry.
+#
+# Every dashboard query lives in app/sql/<group>.sql and is registered as "<group>.<name>":
+#
+#   -- name: qol_turnout
+#   -- description: Quality of Life Index vs Turnout
+#   SELECT ... WHERE ward_number = :ward_number;
+#
+# The files are parsed once at import. Queries run as server-side prepared statements:
+# the first use on a pooled connection issues PREPARE, later uses only EXECUTE, so
+# Postgres parses and plans the big multi-CTE queries once per connection instead of
+# on every callback. Per-query timings are kept for the life of the process.
+#
+#   python app/queries.py list                     # registered queries
+#   python app/queries.py time [runs]              # run every parameterless query, show timings
+#   python app/queries.py explain curated.anomalies [--analyze]
+
+import re
+import sys
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import pandas as pd
+from sqlalchemy.exc import DBAPIError
+
+from db import get_engine
+import resilience
+
+SQL_DIR = Path(__file__).resolve().parent / "sql"
+
+# string literals, quoted identifiers, comments and casts are skipped; :name is a bind
+_TOKENS = re.compile(r"'(?:[^']|'')*'|\"[^\"]*\"|--[^\n]*|::|:([A-Za-z_]\w*)")
+
+
+@dataclass
+class Query:
+    name: str
+    sql: str
+    description: str = ""
+    meta: dict = field(default_factory=dict)
+    params: list = field(default_factory=list)
+    positional_sql: str = ""
+
+    @property
+    def statement(self):
+        # prepared statement names are plain identifiers
+        return "q_" + re.sub(r"\W", "_", self.name)
+
+
+def to_positional(sql):
+    """Rewrite :name binds as $1, $2, ... and return (sql, parameter names in order)."""
+    params = []
+
+    def replace(match):
+        name = match.group(1)
+        if name is None:
+            return match.group(0)
+        if name not in params:
+            params.append(name)
+        return f"${params.index(name) + 1}"
+
+    return _TOKENS.sub(replace, sql), params
+
+
+def parse_sql_file(path):
+    group = path.stem
+    found = {}
+    name, meta, body = None, {}, []
+
+    def finish():
+        if name is None:
+            return
+        sql = "\n".join(body).strip().rstrip(";").strip()
+        positional, params = to_positional(sql)
+        found[f"{group}.{name}"] = Query(
+            name=f"{group}.{name}",
+            sql=sql,
+            description=meta.pop("description", ""),
+            meta=dict(meta),
+            params=params,
+            positional_sql=positional,
+        )
+
+    for line in path.read_text().splitlines():
+        header = re.match(r"--\s*([a-z_]+):\s*(.*)$", line.strip())
+        if header and header.group(1) == "name":
+            finish()
+            name, meta, body = header.group(2).strip(), {}, []
+        elif header and name is not None and not body:
+            # metadata lines directly under the name
+            meta[header.group(1)] = header.group(2).strip()
+        elif name is not None:
+            body.append(line)
+    finish()
+    return found
+
+
+def load_registry(directory=SQL_DIR):
+    registry = {}
+    for path in sorted(directory.glob("*.sql")):
+        registry.update(parse_sql_file(path))
+    return registry
+
+
+REGISTRY = load_registry()
+
+_timings = {}
+_timings_lock = threading.Lock()
+
+
+def get(name):
+    return REGISTRY.get(name)
+
+
+def names(prefix=""):
+    return [name for name in REGISTRY if name.startswith(prefix)]
+
+################################################# EXECUTION #############################################
+
+def _bind(query, params):
+    params = params or {}
+    missing = [p for p in query.params if p not in params]
+    if missing:
+        raise KeyError(f"Query {query.name} is missing parameters: {missing}")
+    return tuple(params[p] for p in query.params)
+
+
+def _prepare(conn, query):
+    prepared = conn.connection.info.setdefault("prepared_statements", set())
+    if query.statement not in prepared:
+        conn.exec_driver_sql(
+            f"PREPARE {query.statement} AS {query.positional_sql}",
+            execution_options={"no_parameters": True},
+        )
+        prepared.add(query.statement)
+
+
+def _execute_sql(query, args, prefix=""):
+    if args:
+        placeholders = ", ".join(["%s"] * len(args))
+        return f"{prefix}EXECUTE {query.statement} ({placeholders})"
+    return f"{prefix}EXECUTE {query.statement}"
+
+
+def execute(conn, query, params=None, prefix=""):
+    """EXECUTE the prepared form of query on conn, preparing it first if needed."""
+    args = _bind(query, params)
+    _prepare(conn, query)
+    sql = _execute_sql(query, args, prefix)
+    try:
+        if args:
+            return conn.exec_driver_sql(sql, args)
+        return conn.exec_driver_sql(sql, execution_options={"no_parameters": True})
+    except DBAPIError as e:
+        # a reload that changed a table's columns invalidates the saved plan's result
+        # type - drop the statement and prepare it again once
+        if getattr(e.orig, "pgcode", None) != "0A000":
+            raise
+        conn.rollback()
+        resilience.prepare_connection(conn)
+        conn.exec_driver_sql(f"DEALLOCATE {query.statement}")
+        conn.connection.info["prepared_statements"].discard(query.statement)
+        _prepare(conn, query)
+        if args:
+            return conn.exec_driver_sql(sql, args)
+        return conn.exec_driver_sql(sql, execution_options={"no_parameters": True})
+
+
+def _record(name, elapsed_ms):
+    with _timings_lock:
+        stats = _timings.setdefault(name, {"calls": 0, "total_ms": 0.0, "max_ms": 0.0})
+        stats["calls"] += 1
+        stats["total_ms"] += elapsed_ms
+        stats["max_ms"] = max(stats["max_ms"], elapsed_ms)
+        stats["last_ms"] = elapsed_ms
+
+
+def run(name, params=None) -> pd.DataFrame:
+    query = REGISTRY[name]
+    start = time.perf_counter()
+    with get_engine().connect() as conn:
+        resilience.prepare_connection(conn)
+        result = execute(conn, query, params)
+        # coerce_float matches pd.read_sql: NUMERIC columns arrive as floats
+        df = pd.DataFrame.from_records(
+            result.fetchall(), columns=list(result.keys()), coerce_float=True
+        )
+    _record(name, (time.perf_counter() - start) * 1000)
+    return df
+
+
+def timings():
+    with _timings_lock:
+        return {
+            name: dict(stats, avg_ms=stats["total_ms"] / stats["calls"])
+            for name, stats in _timings.items()
+        }
+
+
+def explain(name, params=None, analyze=False):
+    """The plan Postgres uses for the prepared statement, as text."""
+    query = REGISTRY[name]
+    options = "ANALYZE, BUFFERS" if analyze else "COSTS"
+    with get_engine().connect() as conn:
+        result = execute(conn, query, params, prefix=f"EXPLAIN ({options}) ")
+        return "\n".join(row[0] for row in result)
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "list"
+    if command == "list":
+        for name, query in REGISTRY.items():
+            binds = f" ({', '.join(query.params)})" if query.params else ""
+            print(f"{name}{binds}  {query.description}")
+    elif command == "time":
+        runs = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+        for name, query in REGISTRY.items():
+            if not query.params:
+                for _ in range(runs):
+                    run(name)
+        print(f"{'query':<40}{'calls':>7}{'avg ms':>10}{'max ms':>10}")
+        for name, stats in sorted(timings().items(), key=lambda item: -item[1]["avg_ms"]):
+            print(f"{name:<40}{stats['calls']:>7}{stats['avg_ms']:>10.1f}{stats['max_ms']:>10.1f}")
+    elif command == "explain":
+        print(explain(sys.argv[2], analyze="--analyze" in sys.argv))
+    else:
+        print(f"Unknown command: {command}")
+        sys.exit(2)
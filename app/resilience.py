@@ -0,0 +1,262 @@
+# Keeping the dashboard responsive when the database is slow or down.
+#
+# Three pieces, used by query_db() and the Data View callbacks in app.py:
+#
+#   deadlines     every guarded callback gets a time budget; its queries run with a
+#                 transaction-local statement_timeout of whatever budget is left
+#   cancellation  queries are tagged (application_name) with the visitor's session and
+#                 the callback, so when the same visitor fires the callback again -
+#                 a new selection - the query still running for the old one is cancelled
+#   breaker       BREAKER_FAILURES database failures in a row open the circuit; for
+#                 BREAKER_RESET_SECONDS callbacks don't touch the database at all and
+#                 serve the last good result, marked stale. Then one trial query decides
+#                 whether the circuit closes again.
+#
+#   python app/resilience.py        # breaker settings and state
+#   python app/resilience.py check  # walk the breaker through its states, no database needed
+
+import functools
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError, TimeoutError as PoolTimeout
+
+CALLBACK_TIMEOUT_MS = int(os.getenv("CALLBACK_TIMEOUT_MS", "10000"))
+BREAKER_FAILURES = int(os.getenv("BREAKER_FAILURES", "5"))
+BREAKER_RESET_SECONDS = float(os.getenv("BREAKER_RESET_SECONDS", "30"))
+LAST_GOOD_ENTRIES = 256
+
+_local = threading.local()
+_process_tag = None
+
+
+class DatabaseUnavailable(Exception):
+    """The circuit is open, or the query failed and there is nothing cached to serve."""
+
+
+class QueryAbandoned(Exception):
+    """The query was cancelled because the same visitor asked for something newer."""
+
+################################################# BREAKER #############################################
+
+class CircuitBreaker:
+    def __init__(self, failures=BREAKER_FAILURES, reset_seconds=BREAKER_RESET_SECONDS):
+        self.failures = failures
+        self.reset_seconds = reset_seconds
+        self.lock = threading.Lock()
+        self.consecutive = 0
+        self.opened_at = None
+        self.trial_running = False
+
+    @property
+    def state(self):
+        with self.lock:
+            if self.opened_at is None:
+                return "closed"
+            if time.monotonic() - self.opened_at < self.reset_seconds:
+                return "open"
+            return "half-open"
+
+    def is_open(self):
+        return self.state == "open"
+
+    def allow(self):
+        """Whether a database call may go ahead now."""
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at < self.reset_seconds or self.trial_running:
+                return False
+            self.trial_running = True  # half-open: exactly one trial call
+            return True
+
+    def success(self):
+        with self.lock:
+            if self.opened_at is not None:
+                print("Circuit breaker closed - database is answering again.")
+            self.consecutive, self.opened_at, self.trial_running = 0, None, False
+
+    def failure(self):
+        with self.lock:
+            self.consecutive += 1
+            if self.trial_running or (self.opened_at is None and self.consecutive >= self.failures):
+                print(f"Circuit breaker open after {self.consecutive} failures - "
+                      f"serving cached results for {self.reset_seconds:.0f}s.")
+                self.opened_at = time.monotonic()
+            self.trial_running = False
+
+    def release(self):
+        """End a trial that never reached the database: the next call becomes the trial."""
+        with self.lock:
+            self.trial_running = False
+
+
+breaker = CircuitBreaker()
+
+
+def _is_abandoned(error):
+    # a cancel we sent, as opposed to a statement timeout
+    return getattr(error.orig, "pgcode", None) == "57014" and "user request" in str(error.orig)
+
+
+@contextmanager
+def guard():
+    """Run database work through the breaker; raises DatabaseUnavailable while it is open."""
+    if not breaker.allow():
+        raise DatabaseUnavailable("circuit breaker open - database calls are paused")
+    try:
+        yield
+    except DBAPIError as e:
+        if _is_abandoned(e):
+            breaker.success()
+            raise QueryAbandoned() from e
+        breaker.failure()
+        raise
+    except PoolTimeout:
+        breaker.failure()
+        raise
+    except BaseException:
+        # not the database's doing (a bad filter, a pandas error...) - it says nothing
+        # about the database, but must not leave a half-open trial running for good
+        breaker.release()
+        raise
+    breaker.success()
+
+################################################# DEADLINES & TAGS #############################################
+
+def guarded(name, timeout_ms=CALLBACK_TIMEOUT_MS):
+    """Give a callback a time budget and a cancellation tag for its queries."""
+    def decorate(callback):
+        @functools.wraps(callback)
+        def wrapper(*args, **kwargs):
+            _local.deadline = time.monotonic() + timeout_ms / 1000
+            _local.tag = _session_tag(name)
+            _local.stale = False
+            try:
+                return callback(*args, **kwargs)
+            finally:
+                _local.deadline = _local.tag = None
+        return wrapper
+    return decorate
+
+
+def _session_tag(name):
+    try:
+        from flask import g, has_request_context
+        session = g.get("session_id") if has_request_context() else None
+    except ImportError:
+        session = None
+    if not session:
+        return None
+    # application_name holds 63 bytes
+    return f"dash:{session[:16]}:{hashlib.sha1(name.encode()).hexdigest()[:8]}"
+
+
+def tag_process(tag):
+    """Tag every query this process runs outside a guarded callback - a background job's,
+    so the worker that stops the job can cancel them."""
+    global _process_tag
+    _process_tag = tag
+
+
+def remaining_ms():
+    deadline = getattr(_local, "deadline", None)
+    if deadline is None:
+        return None
+    return max(int((deadline - time.monotonic()) * 1000), 1)
+
+
+def prepare_connection(conn):
+    """Apply the current callback's deadline and tag to conn's transaction, and cancel
+    whatever the same visitor's previous call of the callback is still running."""
+    timeout, tag = remaining_ms(), getattr(_local, "tag", None)
+    if timeout is None:
+        if _process_tag is not None:
+            conn.execute(text("SELECT set_config('application_name', :tag, true)"), {"tag": _process_tag})
+        return
+    # one round trip: tag this backend, set its deadline, cancel the superseded query
+    conn.execute(text("""
+        SELECT set_config('application_name', :tag, true),
+               set_config('statement_timeout', :timeout, true),
+               (SELECT COUNT(*) FILTER (WHERE pg_cancel_backend(pid))
+                FROM pg_stat_activity
+                WHERE :cancel AND application_name = :tag AND state = 'active'
+                  AND pid <> pg_backend_pid())
+    """), {"tag": tag or "calgary-ward-dashboard", "timeout": str(timeout), "cancel": tag is not None})
+
+################################################# STALE RESULTS #############################################
+
+_last_good = OrderedDict()
+_last_good_lock = threading.Lock()
+
+
+def remember(key, value):
+    with _last_good_lock:
+        _last_good[key] = value
+        _last_good.move_to_end(key)
+        while len(_last_good) > LAST_GOOD_ENTRIES:
+            _last_good.popitem(last=False)
+
+
+def last_good(key):
+    """The last good result for key, marking the current callback's output stale."""
+    with _last_good_lock:
+        value = _last_good.get(key)
+    if value is not None:
+        _local.stale = True
+    return value
+
+
+def is_stale():
+    return getattr(_local, "stale", False)
+
+
+def check():
+    """The breaker's transitions, including a half-open trial failing for reasons of its own."""
+    breaker.reset_seconds = 0
+
+    for _ in range(breaker.failures):
+        breaker.failure()
+    assert breaker.state == "half-open", breaker.state
+
+    # a trial that fails outside the database hands the trial on
+    try:
+        with guard():
+            raise ValueError("bad filter")
+    except ValueError:
+        pass
+    assert breaker.state == "half-open" and not breaker.trial_running
+    assert breaker.allow(), "the next call must become the trial"
+    assert not breaker.allow(), "only one trial at a time"
+
+    # a database failure during the trial reopens the circuit, a clean trial closes it
+    breaker.failure()
+    assert breaker.opened_at is not None and not breaker.trial_running
+    with guard():
+        pass
+    assert breaker.state == "closed"
+
+    # outside a trial, other errors leave the breaker alone
+    try:
+        with guard():
+            raise ValueError("bad filter")
+    except ValueError:
+        pass
+    assert breaker.state == "closed" and breaker.consecutive == 0
+    print("breaker check passed")
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) > 1 and sys.argv[1] == "check":
+        check()
+        sys.exit(0)
+    print(f"callback deadline: {CALLBACK_TIMEOUT_MS} ms")
+    print(f"breaker: opens after {BREAKER_FAILURES} failures, retries after {BREAKER_RESET_SECONDS:.0f}s")
+    print(f"state: {breaker.state}")
@@ -4,14 +4,9 @@
 # All it does is run random checks to make sure data exists in tables.
 # checks table names, counts, rows, queries, and returns the sumary at the end.
 
-import os
 import pandas as pd
-from sqlalchemy import create_engine, text
-
-DATABASE_URL = os.getenv(
-    "DATABASE_URL",
-    "postgresql+psycopg2://appuser:app_password@db:5432/calgary_ward_db"
-)
+from sqlalchemy import text
+from db import get_engine
 
 EXPECTED_TABLES = [
     "ward",
@@ -59,7 +54,7 @@ def sample_rows(conn, table_name, limit=5):
 
 
 def main():
-    engine = create_engine(DATABASE_URL)
+    engine = get_engine()
 
     # Use ONE connection for all checks
     with engine.connect() as conn:
@@ -0,0 +1,288 @@
+# Spatial statistics - which wards border each other, and whether a ward metric clusters
+# across those borders.
+#
+# The loader derives the ward adjacency right after loading ward_boundaries_20251117 and
+# stores it in the ward_adjacency table: two wards are neighbours when they share an
+# edge (rook contiguity - wards meeting at a single point are not). The test runs on the
+# cleaned coverage (boundaries.simplify_coverage without simplification), where shared
+# borders are exactly shared: an STRtree finds the pairs that touch, and the length of
+# their common border, in metres, decides. Nothing here touches geometry after that.
+#
+# On top of the adjacency, with row-standardised weights (a ward's spatial lag is the
+# mean of its neighbours):
+#   Moran's I   global clustering of a metric - positive when neighbouring wards are
+#               alike, negative when they alternate. p-values from the normal
+#               approximation and from SPATIAL_PERMUTATIONS random relabellings
+#   LISA        local Moran's I per ward, with conditional permutation p-values: the
+#               ward keeps its value, its neighbours are redrawn from the other wards.
+#               Significant wards are High-High or Low-Low clusters, or High-Low /
+#               Low-High outliers
+# Every permutation of a metric is evaluated at once as a matrix product. Results are
+# kept per metric and data generation.
+#
+#   python app/spatial.py                  # Moran's I of every map metric
+#   python app/spatial.py turnout_rate     # ... and the LISA clusters of one
+#   python app/spatial.py build            # (re)build ward_adjacency from the database
+
+import os
+import sys
+import threading
+
+import numpy as np
+import pandas as pd
+import shapely
+from scipy import sparse
+from scipy import stats as distributions
+from sqlalchemy import text
+
+from boundaries import simplify_coverage
+from db import get_engine
+from generation import current_generation, on_generation_change
+
+ADJACENCY_TABLE = "ward_adjacency"
+
+SPATIAL_PERMUTATIONS = int(os.getenv("SPATIAL_PERMUTATIONS", "999"))
+SIGNIFICANCE = 0.05
+SEED = 0  # the same p-values on every request and in every worker
+
+# LISA cluster codes, in legend order
+CLUSTERS = ["Not significant", "High-High", "Low-High", "Low-Low", "High-Low"]
+
+# per process, dropped when the data generation changes
+_adjacency = None
+_results = {}
+_lock = threading.Lock()
+
+################################################# ADJACENCY #############################################
+
+def adjacency_pairs(wards, geometry):
+    """(ward, neighbour, shared_m) for every pair of wards sharing an edge, both ways
+    round. geometry is in EPSG:4326."""
+    import geopandas as gpd
+
+    projected = gpd.GeoSeries(geometry, crs="EPSG:4326")
+    projected = projected.to_crs(projected.estimate_utm_crs())
+    geometry = simplify_coverage(projected.values, 0, -1)
+
+    # touches: the pairs whose borders meet - at an edge or at a single point
+    i, j = shapely.STRtree(geometry).query(geometry, predicate="touches")
+    shared = shapely.length(shapely.intersection(geometry[i], geometry[j]))
+    keep = shared > 0  # a point has no length
+    wards = np.asarray(wards)
+    return pd.DataFrame({
+        "ward": wards[i[keep]].astype(int),
+        "neighbour": wards[j[keep]].astype(int),
+        "shared_m": shared[keep].round(1),
+    }).sort_values(["ward", "neighbour"]).reset_index(drop=True)
+
+
+def build_adjacency(engine, wards, geometry):
+    """Derive the ward adjacency from the boundaries and store it in ADJACENCY_TABLE."""
+    pairs = adjacency_pairs(wards, geometry)
+    with engine.begin() as conn:
+        conn.execute(text(f"""
+            CREATE TABLE IF NOT EXISTS {ADJACENCY_TABLE} (
+                ward INTEGER NOT NULL,
+                neighbour INTEGER NOT NULL,
+                shared_m REAL NOT NULL,
+                PRIMARY KEY (ward, neighbour)
+            );
+        """))
+        conn.execute(text(f"DELETE FROM {ADJACENCY_TABLE}"))
+        conn.execute(text(f"""
+            INSERT INTO {ADJACENCY_TABLE} (ward, neighbour, shared_m)
+            VALUES (:ward, :neighbour, :shared_m)
+        """), pairs.to_dict("records"))
+
+    counts = pairs.groupby("ward").size()
+    print(f"  {len(pairs) // 2} shared borders, {counts.min()} to {counts.max()} neighbours per ward")
+    return pairs
+
+
+def build_ward_adjacency(engine):
+    """The adjacency from the boundaries already in the database - for databases
+    initialised from the schema dump, where the loader never ran."""
+    from map_component import load_ward_geometry
+
+    wards = load_ward_geometry()
+    return build_adjacency(engine, wards["ward"], wards.geometry.values)
+
+
+def load_adjacency():
+    """(ward numbers, binary adjacency as a sparse matrix in their order), read once per
+    process and data generation; None when the table is missing or empty."""
+    global _adjacency
+    with _lock:
+        if _adjacency is not None:
+            return _adjacency
+    try:
+        pairs = pd.read_sql(f"SELECT ward, neighbour FROM {ADJACENCY_TABLE}", con=get_engine())
+    except Exception as e:
+        print(f"Ward adjacency unavailable: {str(e).splitlines()[0]}")
+        return None
+    if pairs.empty:
+        return None
+
+    from map_component import load_ward_geometry
+
+    wards = np.sort(load_ward_geometry()["ward"].to_numpy())
+    position = pd.Series(np.arange(len(wards)), index=wards)
+    matrix = sparse.csr_matrix(
+        (np.ones(len(pairs)), (position[pairs["ward"]].to_numpy(), position[pairs["neighbour"]].to_numpy())),
+        shape=(len(wards), len(wards)),
+    )
+    with _lock:
+        _adjacency = (wards, matrix)
+    return _adjacency
+
+################################################# STATISTICS #############################################
+
+def row_standardise(adjacency):
+    """Weights whose rows sum to 1 (rows of wards without neighbours stay 0)."""
+    degree = np.asarray(adjacency.sum(axis=1)).ravel()
+    with np.errstate(divide="ignore"):
+        scale = np.where(degree > 0, 1 / degree, 0)
+    return sparse.diags(scale) @ adjacency
+
+
+def moran(values, adjacency, permutations=SPATIAL_PERMUTATIONS, seed=SEED):
+    """Global Moran's I and LISA of values (one per row of adjacency, no NaNs).
+
+    Returns ({I, expected, z_norm, p_norm, p_sim}, DataFrame of lag, local_i, p_sim and
+    cluster per ward, in values' order).
+    """
+    x = np.asarray(values, dtype=float)
+    n = x.size
+    weights = row_standardise(adjacency).tocsr()
+    z = x - x.mean()
+    zz = z @ z
+    if n < 3 or zz == 0:
+        return None, None
+    rng = np.random.default_rng(seed)
+
+    # global: I = n / S0 * z'Wz / z'z, for the data and every relabelling at once
+    s0 = weights.sum()
+    lag = weights @ z
+    observed = n / s0 * (z @ lag) / zz
+    relabelled = rng.permuted(np.broadcast_to(z, (permutations, n)), axis=1)
+    simulated = n / s0 * np.einsum("pi,pi->p", relabelled, (weights @ relabelled.T).T) / zz
+
+    # normal approximation (Cliff & Ord)
+    symmetric = weights + weights.T
+    s1 = symmetric.multiply(symmetric).sum() / 2
+    s2 = np.sum((np.asarray(weights.sum(axis=1)).ravel() + np.asarray(weights.sum(axis=0)).ravel()) ** 2)
+    expected = -1 / (n - 1)
+    variance = (n * n * s1 - n * s2 + 3 * s0 * s0) / ((n * n - 1) * s0 * s0) - expected ** 2
+    z_norm = (observed - expected) / np.sqrt(variance)
+
+    summary = {
+        "I": float(observed),
+        "expected": expected,
+        "z_norm": float(z_norm),
+        "p_norm": float(2 * distributions.norm.sf(abs(z_norm))),
+        "p_sim": float(folded_p(simulated[:, None], np.array([observed]))[0]),
+    }
+
+    # local: I_i = z_i * lag_i * n / z'z. Conditional permutation keeps ward i's value
+    # and draws its k_i neighbours from the other n - 1 wards: one shuffle of the others
+    # per (permutation, ward), of which the first k_i are the neighbours
+    degree = np.diff(weights.indptr)
+    k = max(int(degree.max()), 1)
+    others = np.arange(n - 1)[None, :]
+    others = others + (others >= np.arange(n)[:, None])  # row i: every ward but i
+    drawn = rng.permuted(np.broadcast_to(others, (permutations, n, n - 1)), axis=2)[:, :, :k]
+    row_weights = np.zeros((n, k))  # ward i's neighbour weights, padded with 0
+    for i in range(n):
+        row = weights.data[weights.indptr[i]:weights.indptr[i + 1]]
+        row_weights[i, :row.size] = row
+    simulated_lag = np.einsum("pik,ik->pi", z[drawn], row_weights)
+
+    local = z * lag * n / zz
+    simulated_local = z * simulated_lag * n / zz
+    p_local = folded_p(simulated_local, local)
+    p_local[degree == 0] = np.nan
+
+    quadrant = np.select(
+        [(z > 0) & (lag > 0), (z < 0) & (lag > 0), (z < 0) & (lag < 0), (z > 0) & (lag < 0)],
+        [1, 2, 3, 4], default=0,
+    )
+    cluster = np.where(p_local < SIGNIFICANCE, quadrant, 0)
+    local_table = pd.DataFrame({
+        "value": x,
+        "lag": lag + x.mean(),
+        "local_i": local,
+        "p_sim": p_local,
+        "cluster": cluster,
+    })
+    return summary, local_table
+
+
+def folded_p(simulated, observed):
+    """Pseudo p-values: the share of permutations at least as extreme as observed, on
+    observed's side of the permutation distribution. simulated is permutations x n."""
+    permutations = simulated.shape[0]
+    larger = (simulated >= observed).sum(axis=0)
+    larger = np.minimum(larger, permutations - larger)
+    return (larger + 1) / (permutations + 1)
+
+
+def ward_clusters(metric):
+    """Moran's I and per-ward LISA for one ward_table metric (map_component), per data
+    generation: {"moran": summary or None, "wards": DataFrame of ward, value, lag,
+    local_i, p_sim, cluster, label}. Wards without a value are left out; a metric the
+    map doesn't offer raises ValueError."""
+    current_generation(get_engine())  # first, so a reload drops the old results
+    with _lock:
+        if metric in _results:
+            return _results[metric]
+
+    from map_component import map_metrics, ward_table
+
+    if metric not in map_metrics():
+        raise ValueError(f"Unknown metric: {metric}")
+
+    loaded = load_adjacency()
+    table = ward_table()[["ward", metric]].dropna()
+    result = {"moran": None, "wards": pd.DataFrame(columns=["ward", "value", "lag", "local_i", "p_sim", "cluster", "label"])}
+    if loaded is not None and len(table) >= 3:
+        wards, adjacency = loaded
+        position = pd.Series(np.arange(len(wards)), index=wards)[table["ward"]].to_numpy()
+        summary, local = moran(table[metric].to_numpy(), adjacency[position][:, position])
+        if summary is not None:
+            local.insert(0, "ward", table["ward"].to_numpy())
+            local["label"] = [CLUSTERS[c] for c in local["cluster"]]
+            result = {"moran": summary, "wards": local}
+
+    with _lock:
+        _results[metric] = result
+    return result
+
+
+@on_generation_change
+def _clear(old, new):
+    global _adjacency
+    if old is not None:
+        with _lock:
+            _adjacency = None
+            _results.clear()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "build":
+        build_ward_adjacency(get_engine())
+        sys.exit(0)
+
+    from map_component import map_metrics
+
+    rows = []
+    for metric in map_metrics():
+        summary = ward_clusters(metric)["moran"]
+        if summary:
+            rows.append({"metric": metric, **summary})
+    table = pd.DataFrame(rows).sort_values("p_sim")
+    print(table.to_string(index=False, float_format=lambda v: f"{v:.4g}"))
+
+    if len(sys.argv) > 1:
+        wards = ward_clusters(sys.argv[1])["wards"]
+        print(f"\n{sys.argv[1]}")
+        print(wards.to_string(index=False, float_format=lambda v: f"{v:.4g}"))
@@ -0,0 +1,215 @@
+-- Curated set queries (Visualizations > Curated Set), one per dropdown entry.
+
+-- name: qol_turnout
+-- description: Quality of Life Index vs Turnout
+WITH qol_metrics AS (
+    SELECT
+        w.ward_number,
+        wp.total as population,
+        -- Services per 1000 residents (positive)
+        COALESCE(cs.total_services, 0) * 1000.0 / wp.total as services_score,
+        -- Recreation per 1000 residents (positive)
+        COALESCE(rec.total_recreation, 0) * 1000.0 / wp.total as recreation_score,
+        -- Transit stops per 1000 residents (positive)
+        wts.active * 1000.0 / wp.total as transit_score,
+        -- Safety: inverse of crime+disorder (negative becomes positive)
+        100 - (wc.rate_per_1000 + wd.rate_per_1000) as safety_score
+    FROM ward w
+    JOIN ward_population wp ON w.ward_number = wp.ward_number
+    LEFT JOIN (SELECT ward_number, SUM(count) as total_services FROM community_services GROUP BY ward_number) cs
+        ON w.ward_number = cs.ward_number
+    LEFT JOIN (SELECT ward_number, SUM(count) as total_recreation FROM ward_recreation GROUP BY ward_number) rec
+        ON w.ward_number = rec.ward_number
+    LEFT JOIN ward_transit_stops wts ON w.ward_number = wts.ward_number
+    LEFT JOIN ward_crime wc ON w.ward_number = wc.ward_number
+    LEFT JOIN ward_disorder wd ON w.ward_number = wd.ward_number
+),
+turnout AS (
+    SELECT
+        vs.ward_number,
+        ROUND(100.0 * SUM(er.votes)::numeric / wp.total, 2) as turnout_rate
+    FROM election_result er
+    JOIN voting_station vs ON er.station_code = vs.station_code
+    JOIN ward_population wp ON vs.ward_number = wp.ward_number
+    JOIN race r ON er.race_id = r.race_id
+    WHERE r.type = 'MAYOR'
+    GROUP BY vs.ward_number, wp.total
+)
+SELECT
+    q.ward_number,
+    -- Composite QoL index (weighted average, normalized)
+    ROUND((q.services_score * 2 + q.recreation_score * 2 + q.transit_score + q.safety_score) / 6, 1) as qol_index,
+    t.turnout_rate
+FROM qol_metrics q
+JOIN turnout t ON q.ward_number = t.ward_number
+ORDER BY q.ward_number;
+
+-- name: age_candidates
+-- description: Candidate Appeal by Age Demographics
+WITH age_profiles AS (
+    SELECT
+        ward_number,
+        -- Youth index: % population aged 20-39
+        ROUND(100.0 * SUM(CASE WHEN age_group IN ('20-24', '25-29', '30-34', '35-39')
+                              THEN total ELSE 0 END) /
+              NULLIF(MAX(CASE WHEN age_group = 'Total' THEN total END), 0), 1) as youth_index,
+        -- Senior index: % population aged 60+
+        ROUND(100.0 * SUM(CASE WHEN age_group IN ('60-64', '65-69', '70-74', '75-79', '80-84', '85-89', '90-94', '95-99', '100 years and over')
+                              THEN total ELSE 0 END) /
+              NULLIF(MAX(CASE WHEN age_group = 'Total' THEN total END), 0), 1) as senior_index
+    FROM ward_age_gender
+    GROUP BY ward_number
+),
+ward_winners AS (
+    SELECT
+        vs.ward_number,
+        c.name as top_candidate,
+        SUM(er.votes) as candidate_votes,
+        RANK() OVER (PARTITION BY vs.ward_number ORDER BY SUM(er.votes) DESC) as rank
+    FROM election_result er
+    JOIN candidate c ON er.candidate_id = c.candidate_id
+    JOIN race r ON er.race_id = r.race_id
+    JOIN voting_station vs ON er.station_code = vs.station_code
+    WHERE r.type = 'MAYOR'
+    GROUP BY vs.ward_number, c.name
+),
+turnout AS (
+    SELECT
+        vs.ward_number,
+        ROUND(100.0 * SUM(er.votes)::numeric / wp.total, 1) as turnout_rate
+    FROM election_result er
+    JOIN voting_station vs ON er.station_code = vs.station_code
+    JOIN ward_population wp ON vs.ward_number = wp.ward_number
+    JOIN race r ON er.race_id = r.race_id
+    WHERE r.type = 'MAYOR'
+    GROUP BY vs.ward_number, wp.total
+)
+SELECT
+    ap.ward_number,
+    ap.youth_index,
+    ap.senior_index,
+    ww.top_candidate,
+    t.turnout_rate
+FROM age_profiles ap
+JOIN ward_winners ww ON ap.ward_number = ww.ward_number AND ww.rank = 1
+JOIN turnout t ON ap.ward_number = t.ward_number
+ORDER BY ap.ward_number;
+
+-- name: edu_employ_triangle
+-- description: Education-Employment-Voting Triangle
+WITH education AS (
+    SELECT
+        ward_number,
+        MAX(CASE WHEN education_level = 'Post Secondary' THEN percent END) as postsecondary_pct
+    FROM ward_education
+    GROUP BY ward_number
+),
+employment AS (
+    SELECT
+        ward_number,
+        AVG(employment_rate) as avg_employment_rate
+    FROM ward_labour_force
+    GROUP BY ward_number
+),
+winners AS (
+    SELECT
+        vs.ward_number,
+        c.name as winning_candidate,
+        RANK() OVER (PARTITION BY vs.ward_number ORDER BY SUM(er.votes) DESC) as rank
+    FROM election_result er
+    JOIN candidate c ON er.candidate_id = c.candidate_id
+    JOIN race r ON er.race_id = r.race_id
+    JOIN voting_station vs ON er.station_code = vs.station_code
+    WHERE r.type = 'MAYOR'
+    GROUP BY vs.ward_number, c.name
+),
+turnout AS (
+    SELECT
+        vs.ward_number,
+        ROUND(100.0 * SUM(er.votes)::numeric / wp.total, 1) as turnout_rate
+    FROM election_result er
+    JOIN voting_station vs ON er.station_code = vs.station_code
+    JOIN ward_population wp ON vs.ward_number = wp.ward_number
+    JOIN race r ON er.race_id = r.race_id
+    WHERE r.type = 'MAYOR'
+    GROUP BY vs.ward_number, wp.total
+)
+SELECT
+    ed.ward_number,
+    ed.postsecondary_pct as education_pct,
+    em.avg_employment_rate as employment_rate,
+    w.winning_candidate,
+    t.turnout_rate
+FROM education ed
+JOIN employment em ON ed.ward_number = em.ward_number
+JOIN winners w ON ed.ward_number = w.ward_number AND w.rank = 1
+JOIN turnout t ON ed.ward_number = t.ward_number
+ORDER BY ed.ward_number;
+
+-- name: accessibility
+-- description: Voting Accessibility Impact
+WITH station_density AS (
+    SELECT
+        vs.ward_number,
+        COUNT(*) as num_stations,
+        wp.total as population,
+        ROUND(COUNT(*) * 10000.0 / wp.total, 2) as stations_per_10k
+    FROM voting_station vs
+    JOIN ward_population wp ON vs.ward_number = wp.ward_number
+    GROUP BY vs.ward_number, wp.total
+),
+turnout AS (
+    SELECT
+        vs.ward_number,
+        ROUND(100.0 * SUM(er.votes)::numeric / wp.total, 2) as turnout_rate
+    FROM election_result er
+    JOIN voting_station vs ON er.station_code = vs.station_code
+    JOIN ward_population wp ON vs.ward_number = wp.ward_number
+    JOIN race r ON er.race_id = r.race_id
+    WHERE r.type = 'MAYOR'
+    GROUP BY vs.ward_number, wp.total
+)
+SELECT
+    sd.ward_number,
+    sd.num_stations,
+    sd.stations_per_10k,
+    t.turnout_rate
+FROM station_density sd
+JOIN turnout t ON sd.ward_number = t.ward_number
+ORDER BY sd.ward_number;
+
+-- name: anomalies
+-- description: Voting Station Anomalies
+WITH station_turnout AS (
+    SELECT
+        er.station_code,
+        vs.ward_number,
+        vs.station_name,
+        SUM(er.votes) as station_votes
+    FROM election_result er
+    JOIN voting_station vs ON er.station_code = vs.station_code
+    JOIN race r ON er.race_id = r.race_id
+    WHERE r.type = 'MAYOR'
+    GROUP BY er.station_code, vs.ward_number, vs.station_name
+),
+ward_avg AS (
+    SELECT
+        vs.ward_number,
+        AVG(station_votes) as ward_avg_votes,
+        STDDEV(station_votes) as ward_stddev
+    FROM station_turnout st
+    JOIN voting_station vs ON st.station_code = vs.station_code
+    GROUP BY vs.ward_number
+)
+SELECT
+    st.station_code,
+    st.ward_number,
+    st.station_name,
+    st.station_votes,
+    wa.ward_avg_votes,
+    ROUND((st.station_votes - wa.ward_avg_votes) / NULLIF(wa.ward_stddev, 0), 2) as z_score
+FROM station_turnout st
+JOIN ward_avg wa ON st.ward_number = wa.ward_number
+WHERE ABS((st.station_votes - wa.ward_avg_votes) / NULLIF(wa.ward_stddev, 0)) > 1.5
+ORDER BY ABS((st.station_votes - wa.ward_avg_votes) / NULLIF(wa.ward_stddev, 0)) DESC
+LIMIT 20;
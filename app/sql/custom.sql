@@ -0,0 +1,433 @@
+-- Custom analysis queries (Visualizations > Custom Analysis), named <characteristic>_<politics>.
+
+-- name: population_turnout
+SELECT
+    wp.ward_number,
+    wp.total as population,
+    SUM(er.votes) AS total_votes
+FROM ward_population wp
+LEFT JOIN voting_station vs ON wp.ward_number = vs.ward_number
+LEFT JOIN election_result er ON vs.station_code = er.station_code
+GROUP BY wp.ward_number, wp.total
+ORDER BY wp.ward_number;
+
+-- name: population_winner
+WITH ward_votes AS (
+    SELECT
+        vs.ward_number,
+        c.name as candidate_name,
+        SUM(er.votes) as total_votes
+    FROM election_result er
+    JOIN candidate c ON er.candidate_id = c.candidate_id
+    JOIN race r ON er.race_id = r.race_id
+    JOIN voting_station vs ON er.station_code = vs.station_code
+    WHERE r.type = 'MAYOR'
+    GROUP BY vs.ward_number, c.name
+)
+SELECT * FROM ward_votes ORDER BY ward_number, total_votes DESC;
+
+-- name: crime_turnout
+SELECT
+    wc.ward_number,
+    wc.rate_per_1000 as crime_rate,
+    SUM(er.votes) as total_votes
+FROM ward_crime wc
+LEFT JOIN voting_station vs ON wc.ward_number = vs.ward_number
+LEFT JOIN election_result er ON vs.station_code = er.station_code
+GROUP BY wc.ward_number, wc.rate_per_1000
+ORDER BY wc.ward_number;
+
+-- name: crime_winner
+WITH ward_winners AS (
+    SELECT
+        vs.ward_number,
+        c.name as candidate_name,
+        SUM(er.votes) as total_votes
+    FROM election_result er
+    JOIN candidate c ON er.candidate_id = c.candidate_id
+    JOIN race r ON er.race_id = r.race_id
+    JOIN voting_station vs ON er.station_code = vs.station_code
+    WHERE r.type = 'MAYOR'
+    GROUP BY vs.ward_number, c.name
+)
+SELECT
+    ww.ward_number,
+    ww.candidate_name,
+    wc.rate_per_1000 as crime_rate,
+    ww.total_votes
+FROM ward_winners ww
+JOIN ward_crime wc ON ww.ward_number = wc.ward_number
+ORDER BY ww.ward_number, ww.total_votes DESC;
+
+-- name: disorder_turnout
+SELECT
+    wd.ward_number,
+    wd.rate_per_1000 as disorder_rate,
+    SUM(er.votes) as total_votes
+FROM ward_disorder wd
+LEFT JOIN voting_station vs ON wd.ward_number = vs.ward_number
+LEFT JOIN election_result er ON vs.station_code = er.station_code
+GROUP BY wd.ward_number, wd.rate_per_1000
+ORDER BY wd.ward_number;
+
+-- name: disorder_winner
+WITH ward_winners AS (
+    SELECT
+        vs.ward_number,
+        c.name as candidate_name,
+        SUM(er.votes) as total_votes
+    FROM election_result er
+    JOIN candidate c ON er.candidate_id = c.candidate_id
+    JOIN race r ON er.race_id = r.race_id
+    JOIN voting_station vs ON er.station_code = vs.station_code
+    WHERE r.type = 'MAYOR'
+    GROUP BY vs.ward_number, c.name
+)
+SELECT
+    ww.ward_number,
+    ww.candidate_name,
+    wd.rate_per_1000 as disorder_rate,
+    ww.total_votes
+FROM ward_winners ww
+JOIN ward_disorder wd ON ww.ward_number = wd.ward_number
+ORDER BY ww.ward_number, ww.total_votes DESC;
+
+-- name: labour_turnout
+WITH labour_summary AS (
+    SELECT
+        ward_number,
+        AVG(employment_rate) as avg_employment_rate,
+        SUM(in_labour_force) as total_labour_force
+    FROM ward_labour_force
+    GROUP BY ward_number
+)
+SELECT
+    ls.ward_number,
+    ls.total_labour_force,
+    ls.avg_employment_rate,
+    SUM(er.votes) as total_votes
+FROM labour_summary ls
+LEFT JOIN voting_station vs ON ls.ward_number = vs.ward_number
+LEFT JOIN election_result er ON vs.station_code = er.station_code
+GROUP BY ls.ward_number, ls.total_labour_force, ls.avg_employment_rate
+ORDER BY ls.ward_number;
+
+-- name: labour_winner
+WITH labour_summary AS (
+    SELECT
+        ward_number,
+        SUM(in_labour_force) as total_labour_force
+    FROM ward_labour_force
+    GROUP BY ward_number
+),
+ward_winners AS (
+    SELECT
+        vs.ward_number,
+        c.name as candidate_name,
+        SUM(er.votes) as total_votes
+    FROM election_result er
+    JOIN candidate c ON er.candidate_id = c.candidate_id
+    JOIN race r ON er.race_id = r.race_id
+    JOIN voting_station vs ON er.station_code = vs.station_code
+    WHERE r.type = 'MAYOR'
+    GROUP BY vs.ward_number, c.name
+)
+SELECT
+    ww.ward_number,
+    ww.candidate_name,
+    ls.total_labour_force,
+    ww.total_votes
+FROM ward_winners ww
+JOIN labour_summary ls ON ww.ward_number = ls.ward_number
+ORDER BY ww.ward_number, ww.total_votes DESC;
+
+-- name: education_turnout
+WITH education_summary AS (
+    SELECT
+        ward_number,
+        MAX(CASE WHEN education_level = 'Post Secondary' THEN percent END) as postsecondary_pct
+    FROM ward_education
+    GROUP BY ward_number
+)
+SELECT
+    es.ward_number,
+    es.postsecondary_pct,
+    SUM(er.votes) as total_votes
+FROM education_summary es
+LEFT JOIN voting_station vs ON es.ward_number = vs.ward_number
+LEFT JOIN election_result er ON vs.station_code = er.station_code
+GROUP BY es.ward_number, es.postsecondary_pct
+ORDER BY es.ward_number;
+
+-- name: education_winner
+WITH education_summary AS (
+    SELECT
+        ward_number,
+        MAX(CASE WHEN education_level = 'Post Secondary' THEN percent END) as postsecondary_pct
+    FROM ward_education
+    GROUP BY ward_number
+),
+ward_winners AS (
+    SELECT
+        vs.ward_number,
+        c.name as candidate_name,
+        SUM(er.votes) as total_votes
+    FROM election_result er
+    JOIN candidate c ON er.candidate_id = c.candidate_id
+    JOIN race r ON er.race_id = r.race_id
+    JOIN voting_station vs ON er.station_code = vs.station_code
+    WHERE r.type = 'MAYOR'
+    GROUP BY vs.ward_number, c.name
+)
+SELECT
+    ww.ward_number,
+    ww.candidate_name,
+    es.postsecondary_pct,
+    ww.total_votes
+FROM ward_winners ww
+JOIN education_summary es ON ww.ward_number = es.ward_number
+ORDER BY ww.ward_number, ww.total_votes DESC;
+
+-- name: income_turnout
+WITH income_summary AS (
+    SELECT
+        ward_number,
+        SUM(household_count) as total_households,
+        -- Calculate weighted average income
+        ROUND(
+            (SUM(CASE WHEN income_group = 'under_$20000' THEN household_count::numeric * 10000 ELSE 0 END) +
+             SUM(CASE WHEN income_group = '$20000_to_$39999' THEN household_count::numeric * 30000 ELSE 0 END) +
+             SUM(CASE WHEN income_group = '$40000_to_$59999' THEN household_count::numeric * 50000 ELSE 0 END) +
+             SUM(CASE WHEN income_group = '$60000_to_$79999' THEN household_count::numeric * 70000 ELSE 0 END) +
+             SUM(CASE WHEN income_group = '$80000_to_$99999' THEN household_count::numeric * 90000 ELSE 0 END) +
+             SUM(CASE WHEN income_group = '$100000_to_$124999' THEN household_count::numeric * 112500 ELSE 0 END) +
+             SUM(CASE WHEN income_group = '$125000_to_$149999' THEN household_count::numeric * 137500 ELSE 0 END) +
+             SUM(CASE WHEN income_group = '$150000_to_$199999' THEN household_count::numeric * 175000 ELSE 0 END) +
+             SUM(CASE WHEN income_group = '$200000_and_over' THEN household_count::numeric * 250000 ELSE 0 END))
+            / NULLIF(SUM(household_count), 0)
+        ) as avg_income
+    FROM ward_income
+    GROUP BY ward_number
+)
+SELECT
+    ims.ward_number,
+    ims.avg_income,
+    SUM(er.votes) as total_votes
+FROM income_summary ims
+LEFT JOIN voting_station vs ON ims.ward_number = vs.ward_number
+LEFT JOIN election_result er ON vs.station_code = er.station_code
+GROUP BY ims.ward_number, ims.avg_income
+ORDER BY ims.ward_number;
+
+-- name: income_winner
+WITH income_summary AS (
+    SELECT
+        ward_number,
+        ROUND(
+            (SUM(CASE WHEN income_group = 'under_$20000' THEN household_count::numeric * 10000 ELSE 0 END) +
+             SUM(CASE WHEN income_group = '$20000_to_$39999' THEN household_count::numeric * 30000 ELSE 0 END) +
+             SUM(CASE WHEN income_group = '$40000_to_$59999' THEN household_count::numeric * 50000 ELSE 0 END) +
+             SUM(CASE WHEN income_group = '$60000_to_$79999' THEN household_count::numeric * 70000 ELSE 0 END) +
+             SUM(CASE WHEN income_group = '$80000_to_$99999' THEN household_count::numeric * 90000 ELSE 0 END) +
+             SUM(CASE WHEN income_group = '$100000_to_$124999' THEN household_count::numeric * 112500 ELSE 0 END) +
+             SUM(CASE WHEN income_group = '$125000_to_$149999' THEN household_count::numeric * 137500 ELSE 0 END) +
+             SUM(CASE WHEN income_group = '$150000_to_$199999' THEN household_count::numeric * 175000 ELSE 0 END) +
+             SUM(CASE WHEN income_group = '$200000_and_over' THEN household_count::numeric * 250000 ELSE 0 END))
+            / NULLIF(SUM(household_count), 0)
+        ) as avg_income
+    FROM ward_income
+    GROUP BY ward_number
+),
+ward_winners AS (
+    SELECT
+        vs.ward_number,
+        c.name as candidate_name,
+        SUM(er.votes) as total_votes
+    FROM election_result er
+    JOIN candidate c ON er.candidate_id = c.candidate_id
+    JOIN race r ON er.race_id = r.race_id
+    JOIN voting_station vs ON er.station_code = vs.station_code
+    WHERE r.type = 'MAYOR'
+    GROUP BY vs.ward_number, c.name
+)
+SELECT
+    ww.ward_number,
+    ww.candidate_name,
+    ims.avg_income,
+    ww.total_votes
+FROM ward_winners ww
+JOIN income_summary ims ON ww.ward_number = ims.ward_number
+ORDER BY ww.ward_number, ww.total_votes DESC;
+
+-- name: services_turnout
+WITH services_summary AS (
+    SELECT
+        ward_number,
+        SUM(count) as total_services
+    FROM community_services
+    GROUP BY ward_number
+)
+SELECT
+    ss.ward_number,
+    ss.total_services,
+    SUM(er.votes) as total_votes
+FROM services_summary ss
+LEFT JOIN voting_station vs ON ss.ward_number = vs.ward_number
+LEFT JOIN election_result er ON vs.station_code = er.station_code
+GROUP BY ss.ward_number, ss.total_services
+ORDER BY ss.ward_number;
+
+-- name: services_winner
+WITH services_summary AS (
+    SELECT
+        ward_number,
+        SUM(count) as total_services
+    FROM community_services
+    GROUP BY ward_number
+),
+ward_winners AS (
+    SELECT
+        vs.ward_number,
+        c.name as candidate_name,
+        SUM(er.votes) as total_votes
+    FROM election_result er
+    JOIN candidate c ON er.candidate_id = c.candidate_id
+    JOIN race r ON er.race_id = r.race_id
+    JOIN voting_station vs ON er.station_code = vs.station_code
+    WHERE r.type = 'MAYOR'
+    GROUP BY vs.ward_number, c.name
+)
+SELECT
+    ww.ward_number,
+    ww.candidate_name,
+    ss.total_services,
+    ww.total_votes
+FROM ward_winners ww
+JOIN services_summary ss ON ww.ward_number = ss.ward_number
+ORDER BY ww.ward_number, ww.total_votes DESC;
+
+-- name: recreation_turnout
+WITH rec_summary AS (
+    SELECT
+        ward_number,
+        SUM(count) as total_recreation
+    FROM ward_recreation
+    GROUP BY ward_number
+)
+SELECT
+    rs.ward_number,
+    rs.total_recreation,
+    SUM(er.votes) as total_votes
+FROM rec_summary rs
+LEFT JOIN voting_station vs ON rs.ward_number = vs.ward_number
+LEFT JOIN election_result er ON vs.station_code = er.station_code
+GROUP BY rs.ward_number, rs.total_recreation
+ORDER BY rs.ward_number;
+
+-- name: recreation_winner
+WITH rec_summary AS (
+    SELECT
+        ward_number,
+        SUM(count) as total_recreation
+    FROM ward_recreation
+    GROUP BY ward_number
+),
+ward_winners AS (
+    SELECT
+        vs.ward_number,
+        c.name as candidate_name,
+        SUM(er.votes) as total_votes
+    FROM election_result er
+    JOIN candidate c ON er.candidate_id = c.candidate_id
+    JOIN race r ON er.race_id = r.race_id
+    JOIN voting_station vs ON er.station_code = vs.station_code
+    WHERE r.type = 'MAYOR'
+    GROUP BY vs.ward_number, c.name
+)
+SELECT
+    ww.ward_number,
+    ww.candidate_name,
+    rs.total_recreation,
+    ww.total_votes
+FROM ward_winners ww
+JOIN rec_summary rs ON ww.ward_number = rs.ward_number
+ORDER BY ww.ward_number, ww.total_votes DESC;
+
+-- name: transit_turnout
+SELECT
+    wts.ward_number,
+    wts.active as active_stops,
+    SUM(er.votes) as total_votes
+FROM ward_transit_stops wts
+LEFT JOIN voting_station vs ON wts.ward_number = vs.ward_number
+LEFT JOIN election_result er ON vs.station_code = er.station_code
+GROUP BY wts.ward_number, wts.active
+ORDER BY wts.ward_number;
+
+-- name: transit_winner
+WITH candidate_transit_votes AS (
+    SELECT
+        c.name as candidate_name,
+        wts.active as active_stops,
+        SUM(er.votes) as total_votes
+    FROM election_result er
+    JOIN candidate c ON er.candidate_id = c.candidate_id
+    JOIN race r ON er.race_id = r.race_id
+    JOIN voting_station vs ON er.station_code = vs.station_code
+    JOIN ward_transit_stops wts ON vs.ward_number = wts.ward_number
+    WHERE r.type = 'MAYOR'
+    GROUP BY c.name, wts.active
+)
+SELECT
+    candidate_name,
+    active_stops,
+    total_votes
+FROM candidate_transit_votes
+ORDER BY active_stops, total_votes DESC;
+
+-- name: work_transit_turnout
+WITH transit_users AS (
+    SELECT
+        ward_number,
+        SUM(CASE WHEN transport_mode = 'Public transit' THEN count ELSE 0 END) as transit_commuters
+    FROM ward_transport_mode
+    GROUP BY ward_number
+)
+SELECT
+    tu.ward_number,
+    tu.transit_commuters,
+    SUM(er.votes) as total_votes
+FROM transit_users tu
+LEFT JOIN voting_station vs ON tu.ward_number = vs.ward_number
+LEFT JOIN election_result er ON vs.station_code = er.station_code
+GROUP BY tu.ward_number, tu.transit_commuters
+ORDER BY tu.ward_number;
+
+-- name: work_transit_winner
+WITH transit_users AS (
+    SELECT
+        ward_number,
+        SUM(CASE WHEN transport_mode = 'Public transit' THEN count ELSE 0 END) as transit_commuters
+    FROM ward_transport_mode
+    GROUP BY ward_number
+),
+ward_winners AS (
+    SELECT
+        vs.ward_number,
+        c.name as candidate_name,
+        SUM(er.votes) as total_votes
+    FROM election_result er
+    JOIN candidate c ON er.candidate_id = c.candidate_id
+    JOIN race r ON er.race_id = r.race_id
+    JOIN voting_station vs ON er.station_code = vs.station_code
+    WHERE r.type = 'MAYOR'
+    GROUP BY vs.ward_number, c.name
+)
+SELECT
+    ww.ward_number,
+    ww.candidate_name,
+    tu.transit_commuters,
+    ww.total_votes
+FROM ward_winners ww
+JOIN transit_users tu ON ww.ward_number = tu.ward_number
+ORDER BY ww.ward_number, ww.total_votes DESC;
@@ -0,0 +1,170 @@
+-- Data View datasets (Data View tab), one per dataset-dropdown entry.
+-- key: the default sort order; together the columns identify a row, which keyset paging needs.
+
+-- name: ward
+-- description: All Calgary wards (1-14)
+-- key: ward_number
+SELECT * FROM ward ORDER BY ward_number;
+
+-- name: election
+-- description: Election events
+-- key: election_date DESC, election_id
+SELECT * FROM election ORDER BY election_date DESC;
+
+-- name: race
+-- description: Election races (Mayor + Councillor by ward)
+-- key: year DESC, type, ward_number, race_id
+SELECT
+    r.race_id,
+    e.year,
+    r.type,
+    r.ward_number,
+    CASE
+        WHEN r.type = 'MAYOR' THEN 'City-wide'
+        ELSE 'Ward ' || r.ward_number::text
+    END as scope
+FROM race r
+JOIN election e ON r.election_id = e.election_id
+ORDER BY e.year DESC, r.type, r.ward_number;
+
+-- name: candidate
+-- description: All candidates
+-- key: name, candidate_id
+SELECT * FROM candidate ORDER BY name;
+
+-- name: candidacy
+-- description: Candidate participation in races
+-- key: year DESC, race_type, ward_number, candidate_name
+SELECT
+    c.name as candidate_name,
+    r.type as race_type,
+    r.ward_number,
+    CASE
+        WHEN r.type = 'MAYOR' THEN 'City-wide'
+        ELSE 'Ward ' || r.ward_number::text
+    END as race_scope,
+    e.year
+FROM candidacy cy
+JOIN candidate c ON cy.candidate_id = c.candidate_id
+JOIN race r ON cy.race_id = r.race_id
+JOIN election e ON r.election_id = e.election_id
+ORDER BY e.year DESC, r.type, r.ward_number, c.name;
+
+-- name: voting_station
+-- description: Physical voting locations by ward
+-- key: ward_number, station_code
+SELECT * FROM voting_station ORDER BY ward_number, station_code;
+
+-- name: election_result
+-- description: Raw election results by voting station (every row, paged on the server)
+-- key: ward_number, station_code, votes DESC, race_type, candidate_name
+SELECT
+    er.station_code,
+    vs.ward_number,
+    c.name as candidate_name,
+    r.type as race_type,
+    er.votes
+FROM election_result er
+JOIN candidate c ON er.candidate_id = c.candidate_id
+JOIN race r ON er.race_id = r.race_id
+JOIN voting_station vs ON er.station_code = vs.station_code
+ORDER BY vs.ward_number, er.station_code, er.votes DESC;
+
+-- name: ward_population
+-- description: Population statistics by ward
+-- key: ward_number
+SELECT * FROM ward_population ORDER BY ward_number;
+
+-- name: ward_age_gender
+-- description: Population by age group and gender
+-- key: ward_number, age_group
+SELECT * FROM ward_age_gender ORDER BY ward_number, age_group;
+
+-- name: ward_income
+-- description: Household income distribution by ward
+-- key: ward_number, income_group
+SELECT * FROM ward_income ORDER BY ward_number, income_group;
+
+-- name: ward_education
+-- description: Education levels by ward
+-- key: ward_number, education_level
+SELECT * FROM ward_education ORDER BY ward_number, education_level;
+
+-- name: ward_labour_force
+-- description: Labour force statistics by ward and gender
+-- key: ward_number, gender
+SELECT * FROM ward_labour_force ORDER BY ward_number, gender;
+
+-- name: ward_transport_mode
+-- description: Commute modes to work by ward
+-- key: ward_number, transport_mode
+SELECT * FROM ward_transport_mode ORDER BY ward_number, transport_mode;
+
+-- name: ward_crime
+-- description: Crime statistics by ward
+-- key: ward_number
+SELECT * FROM ward_crime ORDER BY ward_number;
+
+-- name: ward_disorder
+-- description: Disorder incidents by ward
+-- key: ward_number
+SELECT * FROM ward_disorder ORDER BY ward_number;
+
+-- name: ward_transit_stops
+-- description: Public transit stop counts by ward
+-- key: ward_number
+SELECT * FROM ward_transit_stops ORDER BY ward_number;
+
+-- name: ward_recreation
+-- description: Recreation facilities by type and ward
+-- key: ward_number, facility_type
+SELECT * FROM ward_recreation ORDER BY ward_number, facility_type;
+
+-- name: community_services
+-- description: Community service facilities by ward
+-- key: ward_number, service_type
+SELECT * FROM community_services ORDER BY ward_number, service_type;
+
+-- name: turnout
+-- description: Voter turnout calculated per ward
+-- key: ward_number
+SELECT
+    vs.ward_number,
+    COUNT(DISTINCT er.station_code) as num_stations,
+    SUM(er.votes) AS total_votes,
+    wp.total AS population,
+    ROUND(
+        CASE
+            WHEN wp.total > 0 THEN 100.0 * SUM(er.votes)::numeric / wp.total
+            ELSE NULL
+        END, 2
+    ) AS turnout_rate_percent
+FROM election_result er
+JOIN voting_station vs ON er.station_code = vs.station_code
+LEFT JOIN ward_population wp ON vs.ward_number = wp.ward_number
+GROUP BY vs.ward_number, wp.total
+ORDER BY vs.ward_number;
+
+-- name: winners
+-- description: Election winners (Mayor + 14 Councillors)
+-- key: race_type DESC, race_scope, winner
+WITH race_results AS (
+    SELECT
+        r.race_id,
+        r.type AS race_type,
+        CASE
+            WHEN r.type = 'MAYOR' THEN 'City-wide'
+            ELSE 'Ward ' || r.ward_number::text
+        END AS race_scope,
+        c.name AS candidate_name,
+        SUM(er.votes) AS total_votes,
+        RANK() OVER (PARTITION BY r.race_id ORDER BY SUM(er.votes) DESC) AS rank
+    FROM election_result er
+    JOIN candidate c ON er.candidate_id = c.candidate_id
+    JOIN race r ON er.race_id = r.race_id
+    GROUP BY r.race_id, r.type, r.ward_number, c.name
+)
+SELECT race_type, race_scope, candidate_name AS winner, total_votes
+FROM race_results
+WHERE rank = 1
+ORDER BY CASE race_type WHEN 'MAYOR' THEN 0 ELSE 1 END, race_scope;
@@ -0,0 +1,18 @@
+-- Read-only login role for the Data View SQL console (app/console.py).
+-- :password is bound when the statements run; the role only ever gets SELECT.
+
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT FROM pg_roles WHERE rolname = 'dashboard_console') THEN
+        CREATE ROLE dashboard_console LOGIN;
+    END IF;
+END
+$$;
+
+ALTER ROLE dashboard_console WITH LOGIN NOSUPERUSER NOCREATEDB NOCREATEROLE PASSWORD :password;
+ALTER ROLE dashboard_console SET default_transaction_read_only = on;
+
+REVOKE ALL ON SCHEMA public FROM dashboard_console;
+GRANT USAGE ON SCHEMA public TO dashboard_console;
+GRANT SELECT ON ALL TABLES IN SCHEMA public TO dashboard_console;
+ALTER DEFAULT PRIVILEGES IN SCHEMA public GRANT SELECT ON TABLES TO dashboard_console;
@@ -0,0 +1,22 @@
+-- Workload-driven indexes for the dashboard queries (see index_advisor.py).
+-- Created by the loader after every load; safe to re-run.
+
+-- per-ward aggregation: every turnout / winner query groups stations by ward
+CREATE INDEX IF NOT EXISTS voting_station_ward_idx
+    ON voting_station (ward_number) INCLUDE (station_code, station_name);
+
+-- mayoral-race filter: covers the columns those queries read, so the scan is index-only
+CREATE INDEX IF NOT EXISTS election_result_race_idx
+    ON election_result (race_id) INCLUDE (station_code, candidate_id, votes);
+
+-- candidate joins (per-candidate vote totals)
+CREATE INDEX IF NOT EXISTS election_result_candidate_idx
+    ON election_result (candidate_id) INCLUDE (race_id, votes);
+
+-- race lookups by type ('MAYOR' / 'COUNCILLOR')
+CREATE INDEX IF NOT EXISTS race_type_idx
+    ON race (type) INCLUDE (race_id, ward_number);
+
+-- candidacy listing joins races
+CREATE INDEX IF NOT EXISTS candidacy_race_idx
+    ON candidacy (race_id);
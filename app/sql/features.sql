@@ -0,0 +1,151 @@
+-- Ward feature matrix (features.py) - one row per ward with every characteristic and outcome.
+
+-- name: ward_features
+-- description: Every ward characteristic and political outcome the dashboard plots
+WITH votes AS (
+    SELECT
+        vs.ward_number,
+        SUM(er.votes) AS total_votes,
+        SUM(CASE WHEN r.type = 'MAYOR' THEN er.votes ELSE 0 END) AS mayor_votes
+    FROM election_result er
+    JOIN voting_station vs ON er.station_code = vs.station_code
+    JOIN race r ON er.race_id = r.race_id
+    GROUP BY vs.ward_number
+),
+stations AS (
+    SELECT ward_number, COUNT(*) AS num_stations
+    FROM voting_station
+    GROUP BY ward_number
+),
+labour AS (
+    SELECT
+        ward_number,
+        SUM(in_labour_force) AS total_labour_force,
+        AVG(employment_rate) AS avg_employment_rate
+    FROM ward_labour_force
+    GROUP BY ward_number
+),
+education AS (
+    SELECT
+        ward_number,
+        MAX(CASE WHEN education_level = 'Post Secondary' THEN percent END) AS postsecondary_pct
+    FROM ward_education
+    GROUP BY ward_number
+),
+income AS (
+    SELECT
+        ward_number,
+        ROUND(
+            (SUM(CASE WHEN income_group = 'under_$20000' THEN household_count::numeric * 10000 ELSE 0 END) +
+             SUM(CASE WHEN income_group = '$20000_to_$39999' THEN household_count::numeric * 30000 ELSE 0 END) +
+             SUM(CASE WHEN income_group = '$40000_to_$59999' THEN household_count::numeric * 50000 ELSE 0 END) +
+             SUM(CASE WHEN income_group = '$60000_to_$79999' THEN household_count::numeric * 70000 ELSE 0 END) +
+             SUM(CASE WHEN income_group = '$80000_to_$99999' THEN household_count::numeric * 90000 ELSE 0 END) +
+             SUM(CASE WHEN income_group = '$100000_to_$124999' THEN household_count::numeric * 112500 ELSE 0 END) +
+             SUM(CASE WHEN income_group = '$125000_to_$149999' THEN household_count::numeric * 137500 ELSE 0 END) +
+             SUM(CASE WHEN income_group = '$150000_to_$199999' THEN household_count::numeric * 175000 ELSE 0 END) +
+             SUM(CASE WHEN income_group = '$200000_and_over' THEN household_count::numeric * 250000 ELSE 0 END))
+            / NULLIF(SUM(household_count), 0)
+        ) AS avg_income
+    FROM ward_income
+    GROUP BY ward_number
+),
+services AS (
+    SELECT ward_number, SUM(count) AS total_services
+    FROM community_services
+    GROUP BY ward_number
+),
+recreation AS (
+    SELECT ward_number, SUM(count) AS total_recreation
+    FROM ward_recreation
+    GROUP BY ward_number
+),
+commuters AS (
+    SELECT
+        ward_number,
+        SUM(CASE WHEN transport_mode = 'Public transit' THEN count ELSE 0 END) AS transit_commuters
+    FROM ward_transport_mode
+    GROUP BY ward_number
+)
+SELECT
+    w.ward_number,
+    wp.total AS population,
+    wc.total AS total_crime,
+    wc.rate_per_1000 AS crime_rate,
+    wd.total AS total_disorder,
+    wd.rate_per_1000 AS disorder_rate,
+    l.total_labour_force,
+    l.avg_employment_rate,
+    e.postsecondary_pct,
+    i.avg_income,
+    COALESCE(s.total_services, 0) AS total_services,
+    COALESCE(rec.total_recreation, 0) AS total_recreation,
+    wts.active AS active_stops,
+    c.transit_commuters,
+    st.num_stations,
+    ROUND(st.num_stations * 10000.0 / wp.total, 2) AS stations_per_10k,
+    ROUND((COALESCE(s.total_services, 0) * 1000.0 / wp.total * 2
+         + COALESCE(rec.total_recreation, 0) * 1000.0 / wp.total * 2
+         + wts.active * 1000.0 / wp.total
+         + 100 - (wc.rate_per_1000 + wd.rate_per_1000)) / 6, 1) AS qol_index,
+    v.total_votes,
+    ROUND(100.0 * v.mayor_votes::numeric / wp.total, 2) AS turnout_rate
+FROM ward w
+JOIN ward_population wp ON w.ward_number = wp.ward_number
+LEFT JOIN ward_crime wc ON w.ward_number = wc.ward_number
+LEFT JOIN ward_disorder wd ON w.ward_number = wd.ward_number
+LEFT JOIN ward_transit_stops wts ON w.ward_number = wts.ward_number
+LEFT JOIN labour l ON w.ward_number = l.ward_number
+LEFT JOIN education e ON w.ward_number = e.ward_number
+LEFT JOIN income i ON w.ward_number = i.ward_number
+LEFT JOIN services s ON w.ward_number = s.ward_number
+LEFT JOIN recreation rec ON w.ward_number = rec.ward_number
+LEFT JOIN commuters c ON w.ward_number = c.ward_number
+LEFT JOIN stations st ON w.ward_number = st.ward_number
+LEFT JOIN votes v ON w.ward_number = v.ward_number
+ORDER BY w.ward_number;
+
+-- name: age_gender_shares
+-- description: Each ward's population share by age band, and its female share
+WITH ages AS (
+    SELECT
+        ward_number,
+        CAST(substring(age_group FROM '^[0-9]+') AS INTEGER) AS lower_age,
+        male_count,
+        female_count,
+        total
+    FROM ward_age_gender
+    WHERE age_group <> 'Total'
+)
+SELECT
+    ward_number,
+    ROUND(100.0 * SUM(CASE WHEN lower_age < 20 THEN total ELSE 0 END) / NULLIF(SUM(total), 0), 2) AS age_under_20_pct,
+    ROUND(100.0 * SUM(CASE WHEN lower_age BETWEEN 20 AND 39 THEN total ELSE 0 END) / NULLIF(SUM(total), 0), 2) AS age_20_39_pct,
+    ROUND(100.0 * SUM(CASE WHEN lower_age BETWEEN 40 AND 59 THEN total ELSE 0 END) / NULLIF(SUM(total), 0), 2) AS age_40_59_pct,
+    ROUND(100.0 * SUM(CASE WHEN lower_age >= 60 THEN total ELSE 0 END) / NULLIF(SUM(total), 0), 2) AS age_60_plus_pct,
+    ROUND(100.0 * SUM(female_count) / NULLIF(SUM(male_count + female_count), 0), 2) AS female_pct
+FROM ages
+GROUP BY ward_number
+ORDER BY ward_number;
+
+-- name: mayor_shares
+-- description: Every mayoral candidate's share of the mayoral vote in each ward
+WITH ward_votes AS (
+    SELECT
+        vs.ward_number,
+        c.name AS candidate_name,
+        SUM(er.votes) AS votes
+    FROM election_result er
+    JOIN voting_station vs ON er.station_code = vs.station_code
+    JOIN race r ON er.race_id = r.race_id
+    JOIN candidate c ON er.candidate_id = c.candidate_id
+    WHERE r.type = 'MAYOR'
+    GROUP BY vs.ward_number, c.name
+)
+SELECT
+    ward_number,
+    candidate_name,
+    votes,
+    ROUND(100.0 * votes / NULLIF(SUM(votes) OVER (PARTITION BY ward_number), 0), 2) AS vote_share
+FROM ward_votes
+ORDER BY ward_number, votes DESC;
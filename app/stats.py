@@ -0,0 +1,120 @@
+# Ward statistics - OLS fits and correlations for every characteristic x outcome pair.
+# Outcomes are turnout, total votes, the winning margin and the top mayoral candidates'
+# vote shares; every other column of the feature matrix is a characteristic.
+#
+# Everything is computed from the ward feature matrix (features.py) in one vectorised
+# pass: centred sums become matrix products, so slopes, intercepts, R², p-values and
+# Pearson / Spearman correlations for all pairs come out of a handful of NumPy
+# operations. The results are kept per data generation, and figures draw the cached fit
+# lines instead of fitting a regression on every request.
+#
+#   python app/stats.py                 # every pair, strongest correlations first
+
+import sys
+
+import numpy as np
+import pandas as pd
+from scipy import stats as distributions
+
+from features import SHARE_PREFIX, ward_features
+from generation import current_generation
+
+OUTCOMES = ["turnout_rate", "total_votes", "winning_margin"]
+
+_stats = None
+_stats_generation = None
+
+
+def pairwise_stats(X: pd.DataFrame, Y: pd.DataFrame) -> dict:
+    """{statistic: DataFrame indexed by X's columns, with Y's columns} for every pair.
+
+    Missing values are dropped pair by pair; Spearman ranks each column over its own
+    non-missing values, which is exact whenever the data has no gaps.
+    """
+    x, y = X.to_numpy(dtype=float), Y.to_numpy(dtype=float)
+    mx, my = ~np.isnan(x), ~np.isnan(y)
+    x0, y0 = np.where(mx, x, 0.0), np.where(my, y, 0.0)
+    mx, my = mx.astype(float), my.astype(float)
+
+    def moments(a, b):
+        # pairwise-complete sums for every (column of a, column of b)
+        n = mx.T @ my
+        sa, sb = a.T @ my, mx.T @ b
+        saa, sbb, sab = (a * a).T @ my, mx.T @ (b * b), a.T @ b
+        with np.errstate(divide="ignore", invalid="ignore"):
+            cov = sab - sa * sb / n
+            var_a = saa - sa * sa / n
+            var_b = sbb - sb * sb / n
+        return n, sa, sb, cov, var_a, var_b
+
+    def correlation(cov, var_a, var_b, n):
+        with np.errstate(divide="ignore", invalid="ignore"):
+            r = np.clip(cov / np.sqrt(var_a * var_b), -1.0, 1.0)
+            t = r * np.sqrt((n - 2) / (1 - r * r))
+        p = 2 * distributions.t.sf(np.abs(t), np.maximum(n - 2, 1))
+        return r, np.where(n > 2, p, np.nan)
+
+    n, sx, sy, cov, var_x, var_y = moments(x0, y0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        slope = cov / var_x
+        intercept = (sy - slope * sx) / n
+    pearson, p_value = correlation(cov, var_x, var_y, n)
+
+    rx = np.where(mx > 0, X.rank().to_numpy(dtype=float), 0.0)
+    ry = np.where(my > 0, Y.rank().to_numpy(dtype=float), 0.0)
+    _, _, _, rank_cov, rank_var_x, rank_var_y = moments(rx, ry)
+    spearman, spearman_p = correlation(rank_cov, rank_var_x, rank_var_y, n)
+
+    frame = lambda values: pd.DataFrame(values, index=X.columns, columns=Y.columns)
+    return {
+        "n": frame(n),
+        "slope": frame(slope),
+        "intercept": frame(intercept),
+        "r2": frame(pearson ** 2),
+        "p_value": frame(p_value),
+        "pearson": frame(pearson),
+        "spearman": frame(spearman),
+        "spearman_p": frame(spearman_p),
+    }
+
+
+def outcome_columns(features) -> list:
+    """Political outcomes in the feature matrix: OUTCOMES and the mayoral vote shares."""
+    return OUTCOMES + [c for c in features.columns if c.startswith(SHARE_PREFIX)]
+
+
+def ward_stats(engine) -> dict:
+    """pairwise_stats of every ward characteristic against every outcome, per generation."""
+    global _stats, _stats_generation
+
+    generation = current_generation(engine)
+    if _stats is None or _stats_generation != generation:
+        features = ward_features(engine)
+        outcomes = outcome_columns(features)
+        characteristics = [c for c in features.columns if c not in outcomes]
+        _stats = pairwise_stats(features[characteristics], features[outcomes])
+        _stats_generation = generation
+    return _stats
+
+
+def fit(engine, x, y) -> dict:
+    """Every statistic for one characteristic x outcome pair."""
+    return {name: float(table.at[x, y]) for name, table in ward_stats(engine).items()}
+
+
+def long_table(results) -> pd.DataFrame:
+    """One row per pair - handy for printing and sorting."""
+    table = pd.concat({name: df.stack() for name, df in results.items()}, axis=1)
+    table.index.names = ["characteristic", "outcome"]
+    return table.reset_index()
+
+
+if __name__ == "__main__":
+    from db import get_engine
+
+    table = long_table(ward_stats(get_engine()))
+    outcome = sys.argv[1] if len(sys.argv) > 1 else None
+    if outcome:
+        table = table[table["outcome"] == outcome]
+    table = table.reindex(table["pearson"].abs().sort_values(ascending=False).index)
+    print(table.to_string(index=False, float_format=lambda v: f"{v:.4g}"))
@@ -0,0 +1,206 @@
+# Streamed rows for the Data View's scroll mode.
+#
+# The scroll-mode grid (AG Grid's infinite row model) asks for row windows -
+# startRow..endRow - as the user scrolls. Each distinct view (dataset, filter, sort,
+# data generation) is served from one server-side SCROLL cursor: DECLAREd once on a
+# connection held for it, then every window is a MOVE ABSOLUTE + FETCH, so only the
+# requested rows ever reach Python and the browser keeps a bounded number of blocks.
+#
+# Open cursors hold a connection (and a transaction) each, from a small engine of their
+# own so they never starve the dashboard's pool. At most STREAM_MAX_CURSORS are open per
+# process; the least recently used one is closed to make room, and cursors idle for
+# STREAM_IDLE_SECONDS are closed on the next request. Postgres ends any transaction left
+# idle for twice that, should a worker die holding one.
+#
+#   python app/streaming.py dataset.election_result 30000 30100   # fetch one window
+
+import itertools
+import os
+import sys
+import threading
+import time
+
+import pandas as pd
+from sqlalchemy import text
+
+import paging
+import queries
+from db import make_engine
+
+STREAM_MAX_CURSORS = int(os.getenv("STREAM_MAX_CURSORS", "4"))
+STREAM_IDLE_SECONDS = int(os.getenv("STREAM_IDLE_SECONDS", "120"))
+STREAM_BLOCK_ROWS = int(os.getenv("STREAM_BLOCK_ROWS", "100"))
+
+# AG Grid filter types -> paging.py operators
+_FILTER_TYPES = {
+    "contains": "contains",
+    "equals": "=",
+    "notEqual": "!=",
+    "lessThan": "<",
+    "lessThanOrEqual": "<=",
+    "greaterThan": ">",
+    "greaterThanOrEqual": ">=",
+    "blank": "is blank",
+}
+
+_engine = None
+_cursors = {}
+_cursors_lock = threading.Lock()
+_names = itertools.count(1)
+
+
+def get_stream_engine():
+    global _engine
+    if _engine is None:
+        idle_ms = STREAM_IDLE_SECONDS * 2 * 1000
+        _engine = make_engine(
+            STREAM_MAX_CURSORS, 0,
+            application_name="calgary-ward-dashboard-stream",
+            options=f"-c idle_in_transaction_session_timeout={idle_ms}",
+        )
+    return _engine
+
+################################################# GRID REQUESTS #############################################
+
+def grid_filters(filter_model, columns):
+    """paging.py filters from an AG Grid filterModel (one condition per column)."""
+    known = {c["id"] for c in columns}
+    filters = []
+    for column, condition in (filter_model or {}).items():
+        if column not in known:
+            raise ValueError(f"Unknown column: {column}")
+        if condition.get("type") not in _FILTER_TYPES:
+            raise ValueError(f"Unsupported filter: {condition.get('type')}")
+        filters.append((column, _FILTER_TYPES[condition["type"]], str(condition.get("filter", ""))))
+    return filters
+
+
+def grid_sort(sort_model):
+    """DataTable-style sort_by from an AG Grid sortModel."""
+    return [{"column_id": s["colId"], "direction": s["sort"]} for s in sort_model or []]
+
+
+def column_defs(query_name):
+    """AG Grid column definitions limited to the filters the cursor SQL supports."""
+    defs = []
+    for column in paging.describe(query_name):
+        if column["type"] == "numeric":
+            options = ["equals", "notEqual", "lessThan", "lessThanOrEqual",
+                       "greaterThan", "greaterThanOrEqual", "blank"]
+            kind = "agNumberColumnFilter"
+        else:
+            options = ["contains", "equals", "notEqual", "blank"]
+            kind = "agTextColumnFilter"
+        defs.append({
+            "field": column["id"],
+            "filter": kind,
+            "filterParams": {"filterOptions": options, "maxNumConditions": 1},
+        })
+    return defs
+
+################################################# CURSORS #############################################
+
+class StreamCursor:
+    """A SCROLL cursor over one ordered, filtered dataset view, on its own connection."""
+
+    def __init__(self, sql, binds):
+        self.name = f"stream_{next(_names)}"
+        self.lock = threading.Lock()
+        self.used = time.monotonic()
+        self.row_count = None  # known once a fetch runs past the end
+        self.conn = get_stream_engine().connect()
+        try:
+            self.conn.begin()
+            self.conn.execute(text(f"DECLARE {self.name} SCROLL CURSOR FOR {sql}"), binds)
+        except Exception:
+            self.conn.close()
+            raise
+
+    def fetch(self, start, end):
+        """Rows start..end-1 as a DataFrame."""
+        self.used = time.monotonic()
+        # MOVE ABSOLUTE n leaves the cursor on row n, so the next FETCH returns row n + 1
+        self.conn.execute(text(f"MOVE ABSOLUTE {int(start)} IN {self.name}"))
+        result = self.conn.execute(text(f"FETCH FORWARD {int(end - start)} FROM {self.name}"))
+        df = pd.DataFrame.from_records(result.fetchall(), columns=list(result.keys()), coerce_float=True)
+        # a short window ends the result; an empty one past the end doesn't say where
+        if len(df) < end - start and (len(df) or start == 0):
+            self.row_count = start + len(df)
+        return df
+
+    def close(self):
+        try:
+            self.conn.close()  # rolls back the transaction, which closes the cursor
+        except Exception as e:
+            print(f"Closing {self.name} failed: {e}")
+
+
+def _reap(now):
+    """Close idle cursors, then the least recently used ones down to the limit.
+    Called with _cursors_lock held; cursors busy fetching are skipped."""
+    idle = [k for k, c in _cursors.items() if now - c.used > STREAM_IDLE_SECONDS]
+    by_age = sorted(_cursors, key=lambda k: _cursors[k].used)
+    excess = by_age[:max(len(_cursors) - STREAM_MAX_CURSORS + 1, 0)]
+    for key in dict.fromkeys(idle + excess):
+        cursor = _cursors[key]
+        if cursor.lock.acquire(blocking=False):
+            del _cursors[key]
+            cursor.close()
+            cursor.lock.release()
+
+
+def _cursor(key, sql, binds):
+    with _cursors_lock:
+        cursor = _cursors.get(key)
+        if cursor is None:
+            _reap(time.monotonic())
+            if len(_cursors) >= STREAM_MAX_CURSORS:
+                raise RuntimeError("Every streaming cursor is busy - try again shortly.")
+            cursor = _cursors[key] = StreamCursor(sql, binds)
+        return cursor
+
+
+def fetch_window(query_name, start, end, filter_model=None, sort_model=None, generation=None):
+    """(rows DataFrame, total row count or None while unknown) for one grid window."""
+    query = queries.get(query_name)
+    columns = paging.describe(query_name)
+    filters = grid_filters(filter_model, columns)
+    order = paging.sort_order(query, grid_sort(sort_model), columns)
+    sql, binds = paging.ordered_sql(query, columns, filters, order)
+    key = (query_name, repr(filters), repr(order), generation)
+
+    for attempt in range(2):
+        cursor = _cursor(key, sql, binds)
+        with cursor.lock:
+            try:
+                return cursor.fetch(start, end), cursor.row_count
+            except Exception:
+                # most likely closed under us (idle timeout, restart) - reopen once
+                with _cursors_lock:
+                    if _cursors.get(key) is cursor:
+                        del _cursors[key]
+                cursor.close()
+                if attempt:
+                    raise
+
+
+def open_cursors():
+    with _cursors_lock:
+        return {c.name: round(time.monotonic() - c.used, 1) for c in _cursors.values()}
+
+
+def close_all():
+    with _cursors_lock:
+        for cursor in _cursors.values():
+            cursor.close()
+        _cursors.clear()
+
+
+if __name__ == "__main__":
+    name = sys.argv[1] if len(sys.argv) > 1 else "dataset.election_result"
+    start = int(sys.argv[2]) if len(sys.argv) > 2 else 0
+    end = int(sys.argv[3]) if len(sys.argv) > 3 else start + STREAM_BLOCK_ROWS
+    rows, total = fetch_window(name, start, end)
+    print(rows.to_string())
+    print(f"{len(rows)} rows, total {'unknown' if total is None else total}")
+    close_all()
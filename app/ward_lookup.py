@@ -0,0 +1,172 @@
+# Point-in-ward lookups: which ward each of a batch of lon/lat points falls in.
+#
+# The index is built once per process (and data generation) from ward_boundaries_20251117:
+#
+#   exact test  an STRtree over the prepared ward polygons - the tree narrows each point
+#               to the wards whose bounding box holds it, a prepared intersects test
+#               decides among them
+#   grid        a regular grid of LOOKUP_CELL_METERS cells over the city. A cell no ward
+#               boundary passes through lies wholly in one ward (or in none), so it
+#               stores that ward and its points are answered by array indexing alone;
+#               only points in the few cells a boundary crosses take the exact test
+#
+# The wards are the cleaned coverage (boundaries.simplify_coverage with no simplification),
+# so every point is in at most one ward; a point exactly on a shared border goes to the
+# lower-numbered ward. Points in no ward get 0.
+#
+# Bulk lookups are served at /lookup/ward (see app.py).
+#
+#   python app/ward_lookup.py                   # benchmark on 1,000,000 random points
+#   python app/ward_lookup.py bench 5000000     # ... on as many as you like
+#   python app/ward_lookup.py -114.07 51.05     # one point
+
+import os
+import threading
+import time
+
+import numpy as np
+import shapely
+
+from boundaries import METERS_PER_DEGREE, simplify_coverage
+from generation import on_generation_change
+from map_component import load_ward_geometry
+
+LOOKUP_CELL_METERS = float(os.getenv("LOOKUP_CELL_METERS", "50"))
+LOOKUP_MAX_POINTS = int(os.getenv("LOOKUP_MAX_POINTS", "1000000"))
+
+NO_WARD = 0
+MIXED = -1  # grid cell a boundary passes through
+
+_index = None
+_index_lock = threading.Lock()
+
+
+class WardIndex:
+    def __init__(self, wards, geometry, cell_meters=LOOKUP_CELL_METERS):
+        self.wards = np.asarray(wards, dtype=np.int16)
+        self.geometry = np.asarray(geometry)
+        shapely.prepare(self.geometry)
+        self.tree = shapely.STRtree(self.geometry)
+
+        minx, miny, maxx, maxy = shapely.total_bounds(self.geometry)
+        # square cells on the ground: a degree of longitude is shorter than one of latitude
+        self.dy = cell_meters / METERS_PER_DEGREE
+        self.dx = self.dy / np.cos(np.radians((miny + maxy) / 2))
+        self.x0, self.y0 = minx, miny
+        self.nx = int(np.ceil((maxx - minx) / self.dx)) + 1
+        self.ny = int(np.ceil((maxy - miny) / self.dy)) + 1
+
+        # every cell takes its centre's ward...
+        cx = self.x0 + (np.arange(self.nx) + 0.5) * self.dx
+        cy = self.y0 + (np.arange(self.ny) + 0.5) * self.dy
+        gx, gy = np.meshgrid(cx, cy)
+        grid = self.exact(gx.ravel(), gy.ravel()).reshape(self.ny, self.nx)
+
+        # ...except where a boundary passes through. With boundary vertices at most half a
+        # cell apart, every cell a boundary crosses holds a vertex or borders one that does
+        edges = shapely.segmentize(shapely.boundary(self.geometry), min(self.dx, self.dy) / 2)
+        vx, vy = shapely.get_coordinates(edges).T
+        crossed = np.zeros((self.ny + 2, self.nx + 2), dtype=bool)
+        ix, iy = self.cells(vx, vy)
+        crossed[iy + 1, ix + 1] = True
+        mixed = np.zeros_like(crossed)
+        for dy in (-1, 0, 1):
+            for dx in (-1, 0, 1):
+                mixed |= np.roll(np.roll(crossed, dy, axis=0), dx, axis=1)
+        grid[mixed[1:-1, 1:-1]] = MIXED
+        self.grid = grid
+
+    def cells(self, lon, lat):
+        ix = np.floor((lon - self.x0) / self.dx).astype(np.int64)
+        iy = np.floor((lat - self.y0) / self.dy).astype(np.int64)
+        return ix, iy
+
+    def exact(self, lon, lat):
+        """Ward of every point, by the STRtree and the prepared polygons."""
+        result = np.full(len(lon), NO_WARD, dtype=np.int16)
+        i, j = self.tree.query(shapely.points(lon, lat))  # bounding boxes only
+        hit = shapely.intersects_xy(self.geometry[j], lon[i], lat[i])
+        i, j = i[hit], j[hit]
+        # on a shared border: the lower ward number is written last, and wins
+        order = np.argsort(-self.wards[j], kind="stable")
+        result[i[order]] = self.wards[j[order]]
+        return result
+
+    def lookup(self, lon, lat):
+        """Ward number of every point (NO_WARD outside the wards), as an int16 array."""
+        lon = np.asarray(lon, dtype=float).ravel()
+        lat = np.asarray(lat, dtype=float).ravel()
+        ix, iy = self.cells(lon, lat)
+        inside = (ix >= 0) & (ix < self.nx) & (iy >= 0) & (iy < self.ny)  # NaN lands outside
+
+        result = np.full(len(lon), NO_WARD, dtype=np.int16)
+        result[inside] = self.grid[iy[inside], ix[inside]]
+        mixed = np.flatnonzero(result == MIXED)
+        if mixed.size:
+            result[mixed] = self.exact(lon[mixed], lat[mixed])
+        return result
+
+    def stats(self):
+        return {
+            "cells": self.grid.size,
+            "mixed_cells": int((self.grid == MIXED).sum()),
+            "grid_bytes": self.grid.nbytes,
+        }
+
+
+def get_index():
+    """The ward index, built once per process and data generation."""
+    global _index
+    with _index_lock:
+        if _index is None:
+            wards = load_ward_geometry()
+            _index = WardIndex(wards["ward"], simplify_coverage(wards.geometry.values, 0, -1))
+        return _index
+
+
+@on_generation_change
+def _clear_index(old, new):
+    global _index
+    if old is not None:
+        with _index_lock:
+            _index = None
+
+
+def lookup(lon, lat):
+    """Ward numbers for arrays of lon/lat (0 for points in no ward)."""
+    return get_index().lookup(lon, lat)
+
+
+def benchmark(n):
+    started = time.perf_counter()
+    index = get_index()
+    build = time.perf_counter() - started
+
+    minx, miny, maxx, maxy = shapely.total_bounds(index.geometry)
+    rng = np.random.default_rng(0)
+    lon, lat = rng.uniform(minx, maxx, n), rng.uniform(miny, maxy, n)
+
+    started = time.perf_counter()
+    wards = index.lookup(lon, lat)
+    elapsed = time.perf_counter() - started
+
+    started = time.perf_counter()
+    exact = index.exact(lon, lat)
+    exact_elapsed = time.perf_counter() - started
+
+    stats = index.stats()
+    print(f"index built in {build * 1000:.0f} ms: {stats['cells']} cells of {LOOKUP_CELL_METERS:g} m, "
+          f"{stats['mixed_cells']} on a boundary, {stats['grid_bytes'] // 1024} KB")
+    print(f"grid + STRtree  {n:,} points in {elapsed * 1000:.0f} ms  ({n / elapsed:,.0f} points/s)")
+    print(f"STRtree only    {n:,} points in {exact_elapsed * 1000:.0f} ms  ({n / exact_elapsed:,.0f} points/s)")
+    print(f"{(wards != NO_WARD).mean():.1%} of points in a ward, "
+          f"{'identical' if np.array_equal(wards, exact) else 'DIFFERENT'} results")
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) == 3 and sys.argv[1] != "bench":
+        print(int(lookup([float(sys.argv[1])], [float(sys.argv[2])])[0]))
+    else:
+        benchmark(int(sys.argv[2]) if len(sys.argv) > 2 else 1_000_000)
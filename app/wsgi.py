@@ -0,0 +1,9 @@
+# WSGI entry point for the production server - see gunicorn.conf.py.
+# With preload_app the master imports this module once, so the layout, the map
+# and the rest of the preloaded state are built before any worker is forked.
+
+from app import app, preload_state
+
+preload_state()
+
+server = app.server